@@ -17,10 +17,26 @@ def main(data_dir: Path,
          output_path: Path,
          sample_sheet_path: Path,
          cutoffs: dict,
-         skip: dict):
+         skip: dict,
+         columnar_log: str = None,
+         sqlite_log: Path = None,
+         background_log_writes: bool = False,
+         persist_min_severity: int = None,
+         log_compression: str = None,
+         check_timings: bool = False,
+         memory_profile: bool = False,
+         trace: bool = False):
     """ Calls raw and processed data V-V functions
 
     :params skip: a dictionary denoting steps to VV
+    :params columnar_log: additional full log output format, 'parquet' or 'arrow'
+    :params sqlite_log: SQLite database to additionally write the full log into
+    :params background_log_writes: write the log file from a background thread
+    :params persist_min_severity: only log flags at or above this severity, flags below are counted
+    :params log_compression: write the full and derivative logs compressed, 'gzip' or 'zstd'
+    :params check_timings: write wall time, CPU time, bytes read and flag count per check_id beside the log
+    :params memory_profile: write peak RSS and top allocation sites (tracemalloc) per step beside the log
+    :params trace: write a Chrome trace event file (steps, checks and file I/O) beside the log
     """
     program_header = "STARTING VV for Microarray Raw and Processed Data"
     print(f"{'┅'*(len(program_header)+4)}")
@@ -30,6 +46,14 @@ def main(data_dir: Path,
     flagger = Flagger(script = __file__,
                       log_to = output_path,
                       halt_level = halt_severity,
+                      columnar_log = columnar_log,
+                      sqlite_log = sqlite_log,
+                      background_writes = background_log_writes,
+                      persist_min_severity = persist_min_severity,
+                      log_compression = log_compression,
+                      check_timings = check_timings,
+                      memory_profile = memory_profile,
+                      trace = trace,
                       force_new_flagger = True)
     ########################################################################
     # RNASeqSampleSheet Parsing
@@ -38,6 +62,8 @@ def main(data_dir: Path,
     print(cutoffs)
     sample_sheet = MicroarrayRunsheet(sample_sheet = sample_sheet_path)
     #cross_checks["SampleSheet"] = sample_sheet
+    # derivative logs are written as flags are emitted
+    flagger.add_streaming_derivative_logs(samples = sample_sheet.samples)
     # switch working directory to where data is located
     if data_dir != Path(os.getcwd()):
         print(f"Changing working directory to {data_dir}")
@@ -78,8 +104,8 @@ def main(data_dir: Path,
     # Generate derivative log files
     ###########################################################################
     print(f"{'='*40}")
-    for log_type in ["only-issues", "by-sample", "by-step","all-by-entity"]:
-        flagger.generate_derivative_log(log_type = log_type,
-                                        samples = sample_sheet.samples)
+    flagger.close()
+    flagger.generate_derivative_log(log_type = "all-by-entity",
+                                    samples = sample_sheet.samples)
     # Return flagger at successful completion
     return flagger
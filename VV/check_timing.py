@@ -0,0 +1,120 @@
+""" Per check timing and call counts
+
+Checks measured with Flagger.measure (used by the shared check functions in
+VV.utils and Flagger) are measured for the enclosed block only.  Checks begun
+with Flagger.begin_check, or implicitly when a flag for a new check_id is
+emitted, are measured until another check begins, Flagger.end_check, the step
+changes or the flagger closes, so work done after such a check and before the
+next is counted towards it.  For each check_id the wall time,
+process CPU time, bytes read (rchar in /proc/self/io, where available), number
+of measured intervals and number of flags are accumulated.  Measured intervals
+are also recorded as trace spans when tracing (see VV.tracing).
+"""
+import csv
+import time
+from pathlib import Path
+
+from VV.compression import open_log
+from VV.tracing import begin_span, end_span
+
+CHECK_TIMINGS_HEADER = ["check_id", "step", "calls", "flags", "wall_seconds", "cpu_seconds", "bytes_read"]
+
+def bytes_read() -> int:
+    """ Bytes read by this process so far, None if not available (i.e. not Linux) """
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+class CheckTiming():
+    """ Accumulated measurements for one check_id """
+    __slots__ = ("step", "calls", "flags", "wall_seconds", "cpu_seconds", "bytes_read")
+
+    def __init__(self, step: str):
+        self.step = step
+        self.calls = 0
+        self.flags = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.bytes_read = 0
+
+    def add(self, other: "CheckTiming"):
+        self.calls += other.calls
+        self.flags += other.flags
+        self.wall_seconds += other.wall_seconds
+        self.cpu_seconds += other.cpu_seconds
+        self.bytes_read += other.bytes_read
+
+class CheckTimings():
+    """ Measurements by check_id, in the order checks first began """
+    def __init__(self):
+        self.timings = dict()
+        # (check_id, wall, cpu, bytes read, trace span) when the current check began
+        self._current = None
+        self._has_bytes_read = bytes_read() is not None
+
+    def _timing(self, check_id: str, step: str) -> CheckTiming:
+        timing = self.timings.get(check_id)
+        if timing is None:
+            timing = self.timings[check_id] = CheckTiming(step)
+        return timing
+
+    @property
+    def current(self) -> str:
+        """ check_id being measured, None between checks """
+        return self._current[0] if self._current else None
+
+    def begin(self, check_id: str, step: str):
+        """ Starts measuring a check, ending the current one.  Continues if already measuring this check """
+        if self._current and self._current[0] == check_id:
+            return
+        self.end()
+        self._timing(check_id, step).calls += 1
+        self._current = (check_id, time.perf_counter(), time.process_time(),
+                         bytes_read() if self._has_bytes_read else None,
+                         begin_span(check_id, "check", step = step))
+
+    def end(self):
+        """ Stops measuring the current check, if any """
+        if self._current is None:
+            return
+        check_id, wall, cpu, read, span = self._current
+        self._current = None
+        end_span(span)
+        timing = self.timings[check_id]
+        timing.wall_seconds += time.perf_counter() - wall
+        timing.cpu_seconds += time.process_time() - cpu
+        if read is not None:
+            timing.bytes_read += bytes_read() - read
+
+    def flagged(self, check_id: str, step: str):
+        """ Counts a flag, beginning its check if not the current one """
+        self.begin(check_id, step)
+        self.timings[check_id].flags += 1
+
+    def merge(self, other: "CheckTimings"):
+        """ Adds measurements from another flagger (e.g. a fork), times from concurrent forks are summed """
+        other.end()
+        for check_id, timing in other.timings.items():
+            self._timing(check_id, timing.step).add(timing)
+
+    def rows(self) -> list:
+        """ Table rows, slowest checks (by wall time) first """
+        ordered = sorted(self.timings.items(), key = lambda item: item[1].wall_seconds, reverse = True)
+        return [[check_id, timing.step, timing.calls, timing.flags,
+                 f"{timing.wall_seconds:.6f}", f"{timing.cpu_seconds:.6f}",
+                 timing.bytes_read if self._has_bytes_read else "NA"]
+                for check_id, timing in ordered]
+
+    def write(self, output: Path):
+        """ Appends the table to output, with a header if new """
+        write_header = not output.is_file()
+        with open_log(output, "a") as f:
+            writer = csv.writer(f, delimiter = "\t", lineterminator = "\n")
+            if write_header:
+                writer.writerow(CHECK_TIMINGS_HEADER)
+            writer.writerows(self.rows())
@@ -0,0 +1,125 @@
+""" Compressed log files
+
+Logs are compressed if their name ends with a known suffix (e.g. VV_log.tsv.gz).
+Writers keep one compressor open for the life of the file, each time a file is
+reopened for appending a new gzip member (or zstd frame) is started.  Readers
+read across members/frames so appended runs are read as one log, and read a
+member/frame still being written up to its last flush.
+
+gzip uses the standard library gzip module, zstd requires zstandard (optional dependency).
+"""
+import io
+import gzip
+import zlib
+from pathlib import Path
+
+# compression name to file suffix
+COMPRESSION_SUFFIXES = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+def compression_of(path: Path) -> str:
+    """ Compression for a file based on its suffix, None if not compressed """
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if path.suffix == suffix:
+            return compression
+    return None
+
+def with_compression_suffix(path: Path, compression: str) -> Path:
+    """ Adds the suffix for a compression to a path, if not already present """
+    try:
+        suffix = COMPRESSION_SUFFIXES[compression]
+    except KeyError:
+        raise ValueError(f"Log compression {compression} not implemented.  Try from {list(COMPRESSION_SUFFIXES)}")
+    return path if path.suffix == suffix else path.with_name(path.name + suffix)
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstandard is required to read and write zstd compressed logs. Install with 'pip install zstandard'")
+    return zstandard
+
+def open_log(path: Path, mode: str = "r", offset: int = 0):
+    """ Opens a (possibly compressed) log file as text
+
+    :param mode: 'r', 'w' or 'a'
+    :param offset: for reading, the byte offset in the file to start from.  For compressed
+        logs this must be the start of a gzip member or zstd frame, e.g. the file size before a run appended to it
+    """
+    compression = compression_of(path)
+    if compression is None:
+        f = open(path, mode, newline="")
+        if offset:
+            f.seek(offset)
+        return f
+    if mode == "r":
+        raw = open(path, "rb")
+        raw.seek(offset)
+        if compression == "gzip":
+            binary = io.BufferedReader(_GzipMembers(raw))
+        else:
+            binary = _zstandard().ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return _TextLog(binary, raw)
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", newline="")
+    zstandard = _zstandard()
+    raw = open(path, mode + "b")
+    return _TextLog(zstandard.ZstdCompressor().stream_writer(raw, closefd=True), raw)
+
+class _TextLog(io.TextIOWrapper):
+    """ Text wrapper over a compressed stream that also closes the underlying file """
+    def __init__(self, binary, raw):
+        super().__init__(binary, newline="")
+        self._raw = raw
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._raw.close()
+
+class _GzipMembers(io.RawIOBase):
+    """ Decompresses consecutive gzip members, the last may be unfinished
+
+    gzip.GzipFile raises EOFError for a member without its trailer, i.e. a log
+    that is still open for writing.
+    """
+    CHUNK_SIZE = 2**16
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._decompressor = zlib.decompressobj(wbits = 31)
+        # compressed input not yet decompressed
+        self._input = b""
+        # decompressed data and the offset read up to
+        self._data = b""
+        self._offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while self._offset == len(self._data):
+            if not self._input:
+                self._input = self._raw.read(self.CHUNK_SIZE)
+                if not self._input:
+                    return 0
+            self._data = self._decompress()
+            self._offset = 0
+        size = min(len(buffer), len(self._data) - self._offset)
+        buffer[:size] = memoryview(self._data)[self._offset:self._offset + size]
+        self._offset += size
+        return size
+
+    def _decompress(self) -> bytes:
+        """ Decompresses up to CHUNK_SIZE bytes of the pending input """
+        data = self._decompressor.decompress(self._input, self.CHUNK_SIZE)
+        if self._decompressor.eof:
+            # the next member starts after the end of this one
+            self._input = self._decompressor.unused_data
+            self._decompressor = zlib.decompressobj(wbits = 31)
+        else:
+            self._input = self._decompressor.unconsumed_tail
+        return data
@@ -0,0 +1,148 @@
+""" Derivative logs written as flags are emitted
+
+Each derivative log is registered on a flagger (see _Flagger.derivatives) and
+receives every flag as it is emitted.  Rows are buffered and written when the
+flagger flushes, so derivative files are usable while a run is in progress.
+
+Output matches the files generated by _Flagger.generate_derivative_log from
+the full log.
+"""
+import csv
+import math
+import re
+from pathlib import Path
+
+from VV.flag_messages import message_text
+from VV.compression import open_log, compression_of
+
+# severity codes at or below this are not considered issues
+MAX_NON_ISSUE_FLAG_ID = 30
+
+def _derivative_value(value):
+    """ Converts a log value to text as written in derivative logs """
+    value = message_text(value)
+    if value is None or value == "" or (isinstance(value, float) and math.isnan(value)):
+        return "NA"
+    return value
+
+class _DerivativeFile():
+    """ A derivative log file with buffered rows
+
+    Compressed files (named like the full log, e.g. S1__VV_log.tsv.gz) keep their
+    compressor open between flushes until closed.  Paths are printed relative to
+    cwd if supplied.
+    """
+    def __init__(self, path: Path, header: list, append: bool, cwd: Path = None):
+        self.path = path
+        self._rows = list()
+        self._handle = None
+        # new runs start the file, appended runs continue an existing file
+        if not (append and path.is_file()):
+            path.parent.mkdir(exist_ok=True, parents=True)
+            with open_log(path, "w") as f:
+                csv.writer(f, delimiter="\t", lineterminator="\n").writerow(header)
+            print(f">>> Streaming {path.relative_to(cwd) if cwd else path}")
+
+    def add(self, row):
+        self._rows.append(row)
+
+    def flush(self):
+        if not self._rows:
+            return
+        # values (and messages) are converted to text only when written
+        rows = ([_derivative_value(value) for value in row] for row in self._rows)
+        if compression_of(self.path):
+            if self._handle is None:
+                self._handle = open_log(self.path, "a")
+            csv.writer(self._handle, delimiter="\t", lineterminator="\n").writerows(rows)
+            self._handle.flush()
+        else:
+            with open(self.path, "a", newline="") as f:
+                csv.writer(f, delimiter="\t", lineterminator="\n").writerows(rows)
+        self._rows = list()
+
+    def close(self):
+        self.flush()
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+class DerivativeLog():
+    """ Base for logs derived from flags as they are emitted
+
+    Subclasses implement 'add', called with each flag record (a FlagRecord, fields
+    in full log header order) and 'files', the derivative files currently held.
+    Files are reported relative to cwd (the flagger's working directory) if supplied.
+    """
+    def __init__(self, log_file: Path, header: list, append: bool = False, cwd: Path = None):
+        self.log_file = log_file
+        self.header = header
+        self.append = append
+        self.cwd = cwd
+
+    def add(self, record):
+        raise NotImplementedError
+
+    def files(self) -> list:
+        raise NotImplementedError
+
+    def flush(self):
+        for derivative_file in self.files():
+            derivative_file.flush()
+
+    def close(self):
+        for derivative_file in self.files():
+            derivative_file.close()
+
+class OnlyIssuesLog(DerivativeLog):
+    """ Flags above passing severity, without the full_path column
+    """
+    def __init__(self, log_file: Path, header: list, append: bool = False, cwd: Path = None):
+        super().__init__(log_file, header, append, cwd)
+        self.columns = [column for column in header if column != "full_path"]
+        self._positions = [header.index(column) for column in self.columns]
+        self._file = _DerivativeFile(log_file.parent / f"only-issues__{log_file.name}", self.columns, append, cwd)
+
+    def add(self, record):
+        if record.flag_id > MAX_NON_ISSUE_FLAG_ID:
+            self._file.add([record[position] for position in self._positions])
+
+    def files(self) -> list:
+        return [self._file]
+
+class BySampleLogs(DerivativeLog):
+    """ One log per sample, holding flags where the sample is found in the flag entity
+    """
+    def __init__(self, log_file: Path, header: list, samples: list, append: bool = False, cwd: Path = None):
+        super().__init__(log_file, header, append, cwd)
+        parent_dir = log_file.parent / "bySample"
+        self._patterns = [(re.compile(sample),
+                           _DerivativeFile(parent_dir / f"{sample}__{log_file.name}", header, append, cwd))
+                          for sample in samples]
+
+    def add(self, record):
+        for pattern, derivative_file in self._patterns:
+            if pattern.search(record.sample):
+                derivative_file.add(record)
+
+    def files(self) -> list:
+        return [derivative_file for _, derivative_file in self._patterns]
+
+class ByStepLogs(DerivativeLog):
+    """ One log per step, started when the first flag for the step is emitted
+    """
+    def __init__(self, log_file: Path, header: list, append: bool = False, cwd: Path = None):
+        super().__init__(log_file, header, append, cwd)
+        self._parent_dir = log_file.parent / "byStep"
+        self._files = dict()
+
+    def add(self, record):
+        step = record.step
+        if step not in self._files:
+            # remove spaces in step for filename
+            output = self._parent_dir / f"{step.replace(' ', '_')}__{self.log_file.name}"
+            self._files[step] = _DerivativeFile(output, self.header, self.append, self.cwd)
+        self._files[step].add(record)
+
+    def files(self) -> list:
+        return list(self._files.values())
@@ -4,6 +4,7 @@ import os
 from pathlib import Path
 
 from VV.flagging import Flagger
+from VV.tracing import span
 
 import pandas as pd
 
@@ -124,7 +125,8 @@ class Deseq2ScriptOutput():
 
 
     def _check_dge_table(self, expectedFile, partial_check_args: dict):
-        dge_df = pd.read_csv(expectedFile, index_col=None)
+        with span("read_csv", "io", path = expectedFile):
+            dge_df = pd.read_csv(expectedFile, index_col=None)
         flagged = False
         # check all samples have a column
         missing_sample_cols = set(self.samples) - set(dge_df.columns)
@@ -178,7 +180,8 @@ class Deseq2ScriptOutput():
             self.flagger.flag(**partial_check_args)
 
     def _check_visualization_table(self, expectedFile, partial_check_args: dict):
-        visualization_df = pd.read_csv(expectedFile, index_col=None)
+        with span("read_csv", "io", path = expectedFile):
+            visualization_df = pd.read_csv(expectedFile, index_col=None)
         flagged = False
         # check all samples have a column
         missing_sample_cols = set(self.samples) - set(visualization_df.columns)
@@ -244,7 +247,8 @@ class Deseq2ScriptOutput():
             return
         bySample_summed_gene_counts = self.rsem_cross_checks["bySample_summed_gene_counts"]
 
-        unnorm_df = pd.read_csv(unnorm_counts_file, index_col=0)
+        with span("read_csv", "io", path = unnorm_counts_file):
+            unnorm_df = pd.read_csv(unnorm_counts_file, index_col=0)
 
         for col in unnorm_df.columns:
             sample = col
@@ -266,7 +270,8 @@ class Deseq2ScriptOutput():
         """ Checks that sample names match
         """
         # check if samples match expectation
-        df = pd.read_csv(expectedFile, header=0)
+        with span("read_csv", "io", path = expectedFile):
+            df = pd.read_csv(expectedFile, header=0)
         # in counts tables, samples are columns (excluing first column)
         # in samples table, samples are rows
         check_id = partial_check_args["check_id"]
@@ -292,7 +297,8 @@ class Deseq2ScriptOutput():
            group_1, group_2 = versus_string[1:-1].split(")v(")
            return f"({group_1})", f"({group_2})"
 
-       contrasts_df = pd.read_csv(contrasts_file, index_col=0)
+       with span("read_csv", "io", path = contrasts_file):
+           contrasts_df = pd.read_csv(contrasts_file, index_col=0)
        self.factor_groups_versus = set(contrasts_df.columns)
        self.factor_groups = list()
        parsed_factor_groups = [get_factor_groups(group_versus) for group_versus in self.factor_groups_versus.copy()]
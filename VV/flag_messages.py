@@ -0,0 +1,100 @@
+""" Flag messages rendered only when the text is needed
+
+A FlagMessage holds a template and fields, e.g.
+FlagMessage("{value_alias} outlier [value: {value}]", value_alias = "percent_gc", value = 52.0000001)
+and is rendered (floats rounded to significant figures) the first time a log
+sink converts it to text.  Plain string messages are wrapped as a
+TextFlagMessage, which applies the legacy word based rounding at render time.
+"""
+import math
+
+DEFAULT_SIGFIGS = 2
+
+def round_to_sigfig(value: float, sigfigs: int = DEFAULT_SIGFIGS) -> float:
+    """ Rounds a value to significant figures, zero and non-finite values are returned as is """
+    if value == 0 or not math.isfinite(value):
+        return value
+    return round(value, sigfigs - int(math.floor(math.log10(abs(value)))) - 1)
+
+def round_numbers_in_text(text: str, sigfigs: int = DEFAULT_SIGFIGS, ignore_ints: bool = True) -> str:
+    """ Rounds each whitespace separated word that parses as a float to significant figures
+
+    Words with a trailing square bracket are also rounded, e.g. '[value: 52.0000000]'
+    """
+    new_words = list()
+    for word in text.split():
+        # also catch values that look like this
+        # [value: 52.0000000] <- notice the trailing square bracket!
+        has_trailing_bracket = word[-1] == "]"
+        if has_trailing_bracket:
+            word = word[:-1] # remove temporarily
+
+        # round numeric values to sigfigs
+        is_int = "." not in word
+        if not (ignore_ints and is_int):
+            try:
+                word = str(round_to_sigfig(float(word), sigfigs))
+            except ValueError:
+                pass
+
+        # add back square bracket if removed
+        if has_trailing_bracket:
+            word += "]"
+        new_words.append(word)
+    return " ".join(new_words)
+
+class FlagMessage():
+    """ A message template and its fields, rendered on first conversion to text
+
+    Float fields are rounded to significant figures as written (values like 1e-05 or nan,
+    written without a decimal point, are left as is).
+    """
+    __slots__ = ("template", "fields", "sigfigs", "_text")
+
+    def __init__(self, template: str, sigfigs: int = DEFAULT_SIGFIGS, **fields):
+        self.template = template
+        self.fields = fields
+        self.sigfigs = sigfigs
+        self._text = None
+
+    def _render(self) -> str:
+        fields = {key: self._format_field(value) for key, value in self.fields.items()}
+        return self.template.format(**fields)
+
+    def _format_field(self, value):
+        if isinstance(value, float) and "." in repr(value):
+            return round_to_sigfig(value, self.sigfigs)
+        return value
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = self._render()
+        return self._text
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({str(self)!r})"
+
+class TextFlagMessage(FlagMessage):
+    """ A plain string message with the legacy preprocessing deferred to render time
+
+    Consecutive brackets are spaced, [Number: 1][value: 2] -> [Number: 1] [value: 2], and
+    numeric words are rounded to significant figures unless the message
+    reports flagged_positions.
+    """
+    __slots__ = ()
+
+    def __init__(self, text: str, sigfigs: int = DEFAULT_SIGFIGS):
+        super().__init__(text, sigfigs)
+
+    def _render(self) -> str:
+        text = self.template.replace("][", "] [")
+        # significant figure rounding for non-indice related flags
+        if "flagged_positions" not in text:
+            text = round_numbers_in_text(text, self.sigfigs)
+        return text
+
+def message_text(value):
+    """ Renders flag messages, other log values are returned as is """
+    if isinstance(value, FlagMessage):
+        return str(value)
+    return value
@@ -4,15 +4,32 @@ the V-V checks.  Uses logging
 from typing import Callable
 from datetime import datetime
 import sys
+import re
+import csv
+import os
+import atexit
+import inspect
+import queue
+import threading
+from array import array
 from pathlib import Path
 import math
-from collections import OrderedDict, defaultdict
-from functools import wraps, partial
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import Executor, ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
 pd.set_option('mode.chained_assignment', None)
 
 from VV import __version__
+from VV.derivative_logs import OnlyIssuesLog, BySampleLogs, ByStepLogs
+from VV.log_formats import LOG_FORMATS, DICTIONARY_COLUMNS, EncodedColumn, SqliteLogSink
+from VV.flag_messages import TextFlagMessage, message_text
+from VV.compression import open_log, compression_of, with_compression_suffix
+from VV.check_timing import CheckTimings
+from VV.step_memory import StepMemoryProfiler
+from VV import tracing
 
 FLAG_LEVELS = {
     20:"Info-Only",
@@ -52,13 +69,209 @@ FULL_LOG_HEADER = [
     "outlier_stdev_thresholds_to_flag_ids",
     ]
 
-FULL_REPORT_LINE_TEMPLATE = OrderedDict.fromkeys(FULL_LOG_HEADER)
+# columns holding FlagMessage objects until written
+MESSAGE_COLUMNS = ["user_message", "debug_message"]
 
+# one full report line, fields are the full log header in order
+FlagRecord = namedtuple("FlagRecord", FULL_LOG_HEADER)
+
+# columns of the table of counted (not logged) flags, see persist_min_severity
+COUNTED_FLAGS_HEADER = ["step", "check_id", "sample", "severity", "flag_id", "count"]
+
+# number of flags held in memory before they are written to the log file
+DEFAULT_FLUSH_EVERY = 1000
 
 
 class VVError(Exception):
     pass
 
+def _tsv_value(value):
+    """ Converts a log value to text the same way pandas.to_csv would """
+    value = message_text(value)
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return value
+
+def _flag_id_index():
+    """ Positions of rows by flag_id, module level so stores (and flagger forks) can be pickled """
+    return defaultdict(list)
+
+def _flag_id_counts():
+    return defaultdict(int)
+
+class FlagStore():
+    """ Columnar in-memory store for flags
+
+    Each log column is an appendable list so adding a flag is constant time.
+    Rows are tracked as flushed/pending so the owning flagger can write them
+    to the log file in batches.
+
+    Columns with few distinct values (DICTIONARY_COLUMNS, e.g. step, check_id,
+    full_path) are interned: the buffer holds integer codes into a dictionary
+    of the distinct values seen in that column.
+
+    Rows are also indexed by check_id then flag_id (positions of matching rows)
+    for in-process queries without reading the log file.
+
+    Flags added with 'count_only' are not stored, only counted by
+    (step, check_id, sample, severity, flag_id) and included in 'count'.
+    """
+    def __init__(self, columns: list = FULL_LOG_HEADER, dictionary_columns: list = DICTIONARY_COLUMNS):
+        self.columns = list(columns)
+        self._buffers = {column: array("i") if column in dictionary_columns else list() for column in self.columns}
+        self._dictionaries = {column: list() for column in self.columns if column in dictionary_columns}
+        self._codes = {column: dict() for column in self._dictionaries}
+        # (buffer, codes, dictionary) in FlagRecord field order, codes and dictionary are None if not interned
+        self._record_buffers = [(self._buffers[column], self._codes.get(column), self._dictionaries.get(column))
+                                for column in FlagRecord._fields]
+        self._length = 0
+        self._flushed = 0 # rows already written to the log file
+        self.index = defaultdict(_flag_id_index)
+        self.counted = defaultdict(int)
+        self._counted_index = defaultdict(_flag_id_counts)
+
+    def __len__(self):
+        return self._length
+
+    def append(self, record: FlagRecord):
+        for (buffer, codes, dictionary), value in zip(self._record_buffers, record):
+            if codes is not None:
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(dictionary)
+                    dictionary.append(value)
+                value = code
+            buffer.append(value)
+        self.index[record.check_id][record.flag_id].append(self._length)
+        self._length += 1
+
+    def count_only(self, record: FlagRecord):
+        """ Counts a flag without storing the row """
+        self.counted[(record.step, record.check_id, record.sample, record.severity, record.flag_id)] += 1
+        self._counted_index[record.check_id][record.flag_id] += 1
+
+    def _values(self, column: str, start: int = 0) -> list:
+        """ Values of a column from row 'start', interned columns are decoded """
+        values = self._buffers[column][start:]
+        if column in self._dictionaries:
+            dictionary = self._dictionaries[column]
+            return [dictionary[code] for code in values]
+        return values
+
+    def count(self, check_id: str, flag_ids: list = None) -> int:
+        """ Number of flags (stored or counted) for a check_id, optionally only those with the given flag_ids """
+        by_flag_id = self.index.get(check_id, dict())
+        if flag_ids is None:
+            stored = sum(len(rows) for rows in by_flag_id.values())
+        else:
+            stored = sum(len(by_flag_id.get(flag_id, ())) for flag_id in flag_ids)
+        return stored + self.count_counted(check_id, flag_ids)
+
+    def count_counted(self, check_id: str, flag_ids: list = None) -> int:
+        """ Number of flags added with 'count_only' for a check_id, optionally only those with the given flag_ids """
+        by_flag_id = self._counted_index.get(check_id, dict())
+        if flag_ids is None:
+            return sum(by_flag_id.values())
+        return sum(by_flag_id.get(flag_id, 0) for flag_id in flag_ids)
+
+    @property
+    def pending(self) -> int:
+        return self._length - self._flushed
+
+    def pending_rows(self):
+        """ Yields rows not yet written, in log column order """
+        return zip(*(self._values(column, self._flushed) for column in self.columns))
+
+    def pending_columns(self) -> dict:
+        """ Rows not yet written, as column lists or EncodedColumn for interned columns """
+        columns = dict()
+        for column in self.columns:
+            if column in self._dictionaries:
+                # copied, the buffer cannot be appended to while a view of it exists
+                codes = np.array(self._buffers[column][self._flushed:], dtype=np.int32)
+                columns[column] = EncodedColumn(codes, self._dictionaries[column])
+            else:
+                columns[column] = self._buffers[column][self._flushed:]
+        return columns
+
+    def mark_flushed(self):
+        self._flushed = self._length
+
+    def records(self):
+        """ Yields every row as a FlagRecord, in the order added """
+        return map(FlagRecord._make, zip(*(self._values(column) for column in FlagRecord._fields)))
+
+    def to_df(self) -> pd.DataFrame:
+        """ The store as a dataframe, interned columns as categoricals """
+        columns = dict()
+        for column, buffer in self._buffers.items():
+            dictionary = self._dictionaries.get(column)
+            if column in MESSAGE_COLUMNS:
+                columns[column] = [message_text(value) for value in buffer]
+            elif dictionary is not None and not pd.isna(dictionary).any():
+                codes = np.array(buffer, dtype=np.int32)
+                columns[column] = pd.Categorical.from_codes(codes, categories=pd.Index(dictionary, dtype=object))
+            else:
+                columns[column] = self._values(column)
+        return pd.DataFrame(columns, columns=self.columns)
+
+class BackgroundLogWriter():
+    """ Appends rows to the log file from a writer thread
+
+    Batches of rows are put on a bounded queue (blocking when the writer falls
+    behind) and written by a single thread that keeps the log file open.
+    'drain' waits until queued batches are written and fsyncs the file.
+    """
+    def __init__(self, path: Path, max_queued_batches: int = 8):
+        self.path = path
+        self._queue = queue.Queue(maxsize=max_queued_batches)
+        self._error = None
+        self._file = open_log(path, "a")
+        self._writer = csv.writer(self._file, delimiter="\t", lineterminator="\n")
+        self._thread = threading.Thread(target=self._run, name=f"VV log writer: {path.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            rows = self._queue.get()
+            try:
+                if rows is None:
+                    return
+                # after an error, remaining batches are dropped and the error raised to the flagger
+                if self._error is None:
+                    with tracing.span("write log", "io", path = self.path, rows = len(rows)):
+                        self._writer.writerows([_tsv_value(value) for value in row] for row in rows)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise OSError(f"Failed writing to log file: {self.path}") from self._error
+
+    def write(self, rows: list):
+        self._raise_error()
+        self._queue.put(rows)
+
+    def drain(self):
+        """ Waits until queued rows are written and synced to disk """
+        self._queue.join()
+        self._raise_error()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """ Drains queued rows, stops the writer thread and closes the log file """
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            self._raise_error()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        finally:
+            self._file.close()
+
 class _Flagger():
     """ Flagging object
     """
@@ -66,9 +279,18 @@ class _Flagger():
                  script: str,
                  halt_level: int,
                  log_to: Path,
-                 step: str = "General VV"):
+                 step: str = "General VV",
+                 flush_every: int = DEFAULT_FLUSH_EVERY,
+                 columnar_log: str = None,
+                 sqlite_log: Path = None,
+                 background_writes: bool = False,
+                 persist_min_severity: int = None,
+                 log_compression: str = None,
+                 check_timings: bool = False,
+                 memory_profile: bool = False,
+                 trace: bool = False):
         self._cwd = Path.cwd()
-        self._flag_dict = defaultdict(lambda: 0)
+        self._flag_dict = defaultdict(int)
         self._script = script # location of flagging script
         self._step = step # location of flagging script
         self._severity = FLAG_LEVELS
@@ -77,18 +299,54 @@ class _Flagger():
 
         self._flag_count = 0 # increments for each flag call, useful for testing
 
+        # flags from this run, written to the log file in batches
+        self._store = FlagStore()
+        self._flush_every = flush_every
+        # guards the store and log writes for flaggers shared between threads
+        self._lock = threading.RLock()
+        # when set, log file writes are done by a BackgroundLogWriter thread, started on first flush
+        self._background_writes = background_writes
+        self._writer = None
+        # flags below this severity are counted rather than logged, None logs every flag
+        self._persist_min_severity = persist_min_severity
+        # wall time, CPU time, bytes read and flags by check_id, written beside the log on close if check_timings is set
+        self._check_timings = CheckTimings()
+        self._write_check_timings = check_timings
+        # peak RSS and top allocation sites by step, written beside the log on close
+        self._step_memory = StepMemoryProfiler() if memory_profile else None
+        if self._step_memory:
+            self._step_memory.begin(step)
+        # Chrome trace event JSON of steps, checks and file I/O, written beside the log on close
+        # a new trace, earlier flaggers' events are not included
+        self._trace = trace
+        self._trace_id = tracing.start_trace() if trace else None
+        self._step_span = tracing.begin_span(step, "step")
+        # derivative log generation is profiled/traced as one step
+        self._in_derivative_step = False
+
         # timestamp only used for new logs
         self.timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
 
+        # compressed logs are identified by suffix, e.g. VV_log.tsv.gz
+        if log_compression:
+            log_to = with_compression_suffix(log_to, log_compression)
+        # compressed log files are kept open (one compressor) between flushes
+        self._log_handle = None
+
         # use absolute path
         log_to = log_to.resolve()
+        self._appending = log_to.is_file()
+        # byte offset in the log file where this run's lines start
+        self._run_offset = 0
         # if the file already exists (we are appending results to it)
-        if log_to.is_file():
+        if self._appending:
             log_to_relative_to_cwd = log_to.absolute().relative_to(Path.cwd())
             print(f"Supplied Existing VV flag log: flag output going into {str(log_to_relative_to_cwd)}")
             self._log_file = log_to
             self._log_folder = self._log_file.parent
-            with open(self._log_file, "a+") as f:
+            # existing flags are not loaded, only where this run starts is recorded
+            self._run_offset = self._log_file.stat().st_size
+            with open_log(self._log_file, "a") as f:
                 f.write(f"#Next Python Command: {' '.join(sys.argv)}\n")
         # if the file does not exist, we want to start the file
         else:
@@ -97,21 +355,247 @@ class _Flagger():
             self._log_folder = self._log_file.parent
             self._log_folder.mkdir(exist_ok=True, parents=True)
             self._start_log_file()
-        # load log file as dataframe
-        self.df = self._get_log_as_df()
+        # additional full log outputs, written on each flush
+        self.sinks = list()
+        self._sqlite = None
+        if columnar_log:
+            try:
+                sink_class = LOG_FORMATS[columnar_log]
+            except KeyError:
+                raise ValueError(f"Columnar log format {columnar_log} not implemented.  Try from {list(LOG_FORMATS)}")
+            self.sinks.append(sink_class(self._log_file, FULL_LOG_HEADER, run_label = self.timestamp))
+        # when used, log queries are answered by the database
+        if sqlite_log:
+            self._sqlite = SqliteLogSink(sqlite_log, FULL_LOG_HEADER,
+                                         log_file = self._log_file,
+                                         run_label = self.timestamp,
+                                         command = ' '.join(sys.argv),
+                                         read_history = self._read_log_file,
+                                         log_started = self._log_started(),
+                                         start_offset = self._run_offset)
+            self.sinks.append(self._sqlite)
+        # header line is only written for logs without prior flags
+        self._write_header = not self._log_has_flags()
+        _open_flaggers.add(self)
 
     def _start_log_file(self):
         """ Starts a new full log file with a comment header
         """
         print(f"Starting new log file: {self._log_file.relative_to(Path.cwd())}")
-        with open(self._log_file, "w") as f:
+        with open_log(self._log_file, "w") as f:
             f.write("#START OF VV RUN:\n")
             f.write(f"#Time started: {self.timestamp}\n")
             f.write(f"#VV Program Version: {__version__}\n")
             f.write(f"#Python Command: {' '.join(sys.argv)}\n")
 
+    def _log_started(self) -> str:
+        """ Time the log file was started (its '#Time started' comment), None if not found
+
+        Identifies a log file, a log recreated at the same path has a new start time.
+        """
+        with open_log(self._log_file) as f:
+            for line in f:
+                if not line.startswith("#"):
+                    break
+                if line.startswith("#Time started: "):
+                    return line[len("#Time started: "):].strip()
+        return None
+
+    def _log_has_flags(self) -> bool:
+        """ Checks if the log file has a header line, i.e. flags were written by a prior run
+
+        Stops at the first non-comment line so this does not depend on the log size.
+        """
+        with open_log(self._log_file) as f:
+            return any(not line.startswith("#") for line in f)
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """ In memory log: flags from this run """
+        return self._store.to_df()
+
+    def flush(self):
+        """ Writes pending flags to the log file
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._store.pending:
+            return
+        span = tracing.begin_span("flush", "io", path = self._log_file, flags = self._store.pending)
+        rows = list(self._store.pending_rows())
+        if self._write_header:
+            rows.insert(0, FULL_LOG_HEADER)
+            self._write_header = False
+        if self._background_writes:
+            if self._writer is None:
+                self._writer = BackgroundLogWriter(self._log_file)
+            self._writer.write(rows)
+        elif compression_of(self._log_file):
+            if self._log_handle is None:
+                self._log_handle = open_log(self._log_file, "a")
+            writer = csv.writer(self._log_handle, delimiter="\t", lineterminator="\n")
+            writer.writerows([_tsv_value(value) for value in row] for row in rows)
+            # readable mid-run, flushing the compressor
+            self._log_handle.flush()
+        else:
+            with open(self._log_file, "a", newline="") as f:
+                writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+                writer.writerows([_tsv_value(value) for value in row] for row in rows)
+        if self.sinks:
+            pending_columns = self._store.pending_columns()
+            for sink in self.sinks:
+                sink.write_batch(pending_columns)
+        self._store.mark_flushed()
+        for derivative in self.derivatives:
+            derivative.flush()
+        tracing.end_span(span)
+
+    def sync(self):
+        """ Flushes pending flags and waits until they are written to the log file
+        """
+        self.flush()
+        if self._writer is not None:
+            self._writer.drain()
+
+    def close(self):
+        """ Flushes pending flags and finalizes the log file and additional log outputs
+        """
+        with self._lock:
+            _open_flaggers.discard(self)
+            self._flush()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            if self._log_handle is not None:
+                self._log_handle.close()
+                self._log_handle = None
+            for sink in self.sinks:
+                sink.close()
+            for derivative in self.derivatives:
+                derivative.close()
+            self._write_counted_flags()
+            self._check_timings.end()
+            if self._write_check_timings:
+                self._write_check_timings_table()
+            if self._step_memory:
+                self._step_memory.stop()
+                self._write_step_memory_table()
+            tracing.end_span(self._step_span)
+            self._step_span = None
+            if self._trace:
+                self._write_trace()
+
+    def _write_counted_flags(self):
+        """ Appends counts of flags below persist_min_severity to a table beside the log
+
+        i.e. counted__VV_log.tsv, one row per step, check_id, sample and flag_id
+        """
+        if not self._store.counted:
+            return
+        output = self._log_folder / f"counted__{self._log_file.name}"
+        write_header = not output.is_file()
+        with open_log(output, "a") as f:
+            writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+            if write_header:
+                writer.writerow(COUNTED_FLAGS_HEADER)
+            writer.writerows([*key, count] for key, count in self._store.counted.items())
+        self._store.counted.clear()
+        print(f">>> Wrote counts of flags below severity {self._persist_min_severity} to {output.relative_to(self._cwd)}")
+
+    def _write_check_timings_table(self):
+        """ Appends wall time, CPU time, bytes read and flag count per check_id to a table beside the log
+
+        i.e. check_timings__VV_log.tsv, slowest checks first
+        """
+        if not self._check_timings.timings:
+            return
+        output = self._log_folder / f"check_timings__{self._log_file.name}"
+        self._check_timings.write(output)
+        self._check_timings = CheckTimings()
+        print(f">>> Wrote check timings to {output.relative_to(self._cwd)}")
+
+    def _write_step_memory_table(self):
+        """ Appends peak RSS and top allocation sites per step to a table beside the log
+
+        i.e. step_memory__VV_log.tsv
+        """
+        if not self._step_memory.rows:
+            return
+        output = self._log_folder / f"step_memory__{self._log_file.name}"
+        self._step_memory.write(output)
+        print(f">>> Wrote step memory usage to {output.relative_to(self._cwd)}")
+
+    def _write_trace(self):
+        """ Writes the trace (steps, checks and file I/O so far) beside the log
+
+        i.e. trace__VV_log.json, opens in chrome://tracing or Perfetto
+        """
+        if tracing.current_trace() != self._trace_id:
+            # stopped, or replaced by a later flagger's trace
+            return
+        output = self._log_folder / f"trace__{self._log_file.name.split('.')[0]}.json"
+        tracing.write_trace(output)
+        print(f">>> Wrote trace to {output.relative_to(self._cwd)}")
+
+    @property
+    def check_timings(self) -> dict:
+        """ CheckTiming by check_id, for checks measured so far """
+        return self._check_timings.timings
+
+    def begin_check(self, check_id: str):
+        """ Starts measuring a check, ending the measurement of the previous check
+
+        Calling again for the check being measured continues its measurement, so this
+        can be called per sample or file within a check.
+        """
+        with self._lock:
+            self._check_timings.begin(check_id, self._step)
+
+    def end_check(self):
+        """ Stops measuring the current check """
+        with self._lock:
+            self._check_timings.end()
+
+    @contextmanager
+    def measure(self, check_id: str):
+        """ Measures the enclosed block as part of a check
+
+        with flagger.measure("R_0002"):
+            ...
+
+        Within a measurement of the same check (e.g. a shared check function called
+        by another) the block continues it and the enclosing measurement ends it.
+        """
+        with self._lock:
+            continuing = self._check_timings.current == check_id
+            self._check_timings.begin(check_id, self._step)
+        try:
+            yield
+        finally:
+            if not continuing:
+                self.end_check()
+
+    def add_streaming_derivative_logs(self, samples: list):
+        """ Registers the only-issues, by-sample and by-step derivative logs
+
+        These are written as flags are emitted rather than generated from
+        the full log at the end of the run.
+        """
+        self.derivatives.extend([
+            OnlyIssuesLog(self._log_file, FULL_LOG_HEADER, append = self._appending, cwd = self._cwd),
+            BySampleLogs(self._log_file, FULL_LOG_HEADER, samples = samples, append = self._appending, cwd = self._cwd),
+            ByStepLogs(self._log_file, FULL_LOG_HEADER, append = self._appending, cwd = self._cwd),
+            ])
+
     def set_step(self, step: str):
+        self.end_check()
         self._step = step
+        if self._step_memory:
+            self._step_memory.begin(step)
+        tracing.end_span(self._step_span)
+        self._step_span = tracing.begin_span(step, "step")
 
     def set_script(self, script: str):
         self._script = script
@@ -146,16 +630,10 @@ class _Flagger():
         is good enough as a user message, leaving user message blank to allow
         override works great!
         """
-        self._flag_count += 1
-        self._flag_dict[severity] += 1
         # not required but provides some quality of life improvements in the log debug_messages
-        if preprocess_debug_messages:
-            # space out consecutive [Number: 1][value: 2] -> [Number: 1] [value: 2]
-            debug_message = debug_message.replace("][","] [")
-            # significant figure rounding for non-indice related flags
-            if "flagged_positions" not in debug_message:
-                debug_message = self._parse_debug_message_and_round_values_to_sigfig(debug_message)
-            #### END PREPROCESS MESSAGES ####
+        # applied when the message is first written by a log sink
+        if preprocess_debug_messages and isinstance(debug_message, str):
+            debug_message = TextFlagMessage(debug_message)
 
         # convert sub entity labels according to a mapping if supplied
         if convert_sub_entity and sub_entity != "NA":
@@ -188,112 +666,370 @@ class _Flagger():
             units_for_thresholds = entity_value_units # should be safe in most cases, even where entity value units is NA (just replaces NA with NA)
 
 
-        report = FULL_REPORT_LINE_TEMPLATE.copy()
-        report.update({
-                  "sample": entity,
-                  "sub_entity": sub_entity,
-                  "severity": self._severity[severity],
-                  "flag_id": severity,
-                  "step": self._step,
-                  "script":self._script,
-                  "user_message": user_message,
-                  "debug_message": debug_message,
-                  "check_id": check_id,
-                  "full_path": full_path,
-                  "filename": filename,
-                  "flagged_positions": flagged_positions,
-                  "entity_value": entity_value,
-                  "entity_value_units": entity_value_units,
-                  "outlier_comparison_type": outlier_comparison_type,
-                  "max_thresholds_to_flag_ids": max_thresholds,
-                  "min_thresholds_to_flag_ids": min_thresholds,
-                  "max_min_thresholds_units": units_for_thresholds,
-                  "outlier_stdev_thresholds_to_flag_ids": outlier_thresholds,
-                  "position_units": position_units
-                  })
-
-        # ensure report dict matches expected headers
-        assert report.keys() == FULL_REPORT_LINE_TEMPLATE.keys(), "Report keys MUST be the ones expected full log header."
-        add_df = pd.DataFrame.from_records([report])
-        # add to in memory log
-        self.df = pd.concat([self.df, add_df])
-        #if len(self.df) % 50 == 0:
-        #    print(self.df) # debug
-        # add to file log, if first log add header
-        if len(self.df) == 1:
-            add_df.to_csv(self._log_file, mode="a", index=False, sep="\t")
-        else:
-            add_df.to_csv(self._log_file, mode="a", index=False, sep="\t", header=False)
+        record = FlagRecord(sample = entity,
+                            sub_entity = sub_entity,
+                            severity = self._severity[severity],
+                            flag_id = severity,
+                            step = self._step,
+                            script = self._script,
+                            user_message = user_message,
+                            debug_message = debug_message,
+                            check_id = check_id,
+                            filename = filename,
+                            full_path = full_path,
+                            flagged_positions = flagged_positions,
+                            position_units = position_units,
+                            entity_value = entity_value,
+                            entity_value_units = entity_value_units,
+                            outlier_comparison_type = outlier_comparison_type,
+                            max_thresholds_to_flag_ids = max_thresholds,
+                            min_thresholds_to_flag_ids = min_thresholds,
+                            max_min_thresholds_units = units_for_thresholds,
+                            outlier_stdev_thresholds_to_flag_ids = outlier_thresholds)
+
+        self._emit(record)
+
+    def _emit(self, record: FlagRecord, merged: bool = False):
+        """ Adds a flag to the log, halting if severe enough
+
+        Flags merged from forks were counted in the fork's check timings.
+        """
+        with self._lock:
+            if not merged:
+                self._check_timings.flagged(record.check_id, record.step)
+            self._flag_count += 1
+            self._flag_dict[record.flag_id] += 1
+            if self._persist_min_severity is not None and record.flag_id < self._persist_min_severity:
+                # written as a table of counts on close
+                if not self._store.counted:
+                    # flags counted after close are written at exit
+                    _open_flaggers.add(self)
+                self._store.count_only(record)
+            else:
+                # add to in memory log, file log is written in batches
+                self._store.append(record)
+                if self._store.pending == 1:
+                    # flags added after close are written at exit
+                    _open_flaggers.add(self)
+                for derivative in self.derivatives:
+                    derivative.add(record)
+                if self._store.pending >= self._flush_every:
+                    self.flush()
 
         # full exit upon severe enough issue
-        if severity >= self._halt_level:
-            raise VVError(f"SEVERE ISSUE, HALTING V-V AND ANY ADDITIONAL PROCESSING\nHalting flag message: '{report['debug_message']}'")
+        if record.flag_id >= self._halt_level:
+            self.close()
+            raise VVError(f"SEVERE ISSUE, HALTING V-V AND ANY ADDITIONAL PROCESSING\nHalting flag message: '{record.debug_message}'")
+
+    def fork(self, step: str = None, script: str = None):
+        """ Creates a flagger for a step or worker, merged back with 'merge'
+
+        The fork collects flags in memory with its own step and script (defaults to
+        this flagger's current step and script) and counters, and does not write to
+        the log.  A halting flag raises the VVError in the fork.
+        """
+        return FlaggerFork(parent = self,
+                           step = step if step is not None else self._step,
+                           script = script if script is not None else self._script)
+
+    def merge(self, forks: list):
+        """ Adds flags collected by forks to this flagger, fork by fork in the supplied order
+
+        Merging in a fixed order gives the same log regardless of when forks finished.
+        A halting flag halts here as it would have if flagged directly, flags after it
+        (including later forks) are not merged.
+        """
+        with self._lock:
+            for fork in forks:
+                self._check_timings.merge(fork._check_timings)
+                for record in fork._store.records():
+                    self._emit(record, merged = True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def flag_many(self,
+                  check_id: str,
+                  results,
+                  **common):
+        """ Logs one flag per row of results for a single check
+
+        :param check_id: check_id for every flag
+        :param results: a DataFrame or a mapping of flag argument name to a sequence of values, one value per flag (e.g. 'entity', 'severity', 'debug_message')
+        :param common: flag arguments shared by every flag (e.g. 'full_path', 'filename')
+
+        Each row is flagged in order by calling flag with the row's values and the
+        common arguments.  A row at or above the halt level raises the VVError after
+        flagging the rows before it.  Missing or unknown flag arguments and columns
+        of unequal length raise a ValueError before any row is flagged.
+        """
+        if isinstance(results, pd.DataFrame):
+            # tolist converts numpy scalars to python types
+            columns = {column: results[column].tolist() for column in results.columns}
+        else:
+            columns = {column: list(values) for column, values in results.items()}
+        arguments = {"check_id", *columns, *common}
+        if missing := [name for name in FLAG_REQUIRED_ARGUMENTS if name not in arguments]:
+            raise ValueError(f"Missing flag arguments for {check_id}, supply as result columns or common arguments: {missing}")
+        if unknown := [name for name in arguments if name not in FLAG_ARGUMENTS]:
+            raise ValueError(f"Unknown flag arguments for {check_id}: {unknown}. Try from {FLAG_ARGUMENTS}")
+        if overlap := [name for name in columns if name in common or name == "check_id"]:
+            raise ValueError(f"Flag arguments for {check_id} supplied as both result columns and common arguments: {overlap}")
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Result columns for {check_id} must be equal length, got lengths: { {column: len(values) for column, values in columns.items()} }")
+        for row in zip(*columns.values()):
+            self.flag(check_id = check_id, **common, **dict(zip(columns, row)))
 
     def flag_file_exists(self,
                          check_file: Path,
                          partial_check_args: dict,
                          optional: bool = False
                          ):
-        if not check_file.is_file():
-            partial_check_args["debug_message"] = f"{check_file.name} not found"
-            partial_check_args["full_path"] = str(check_file.resolve())
-            partial_check_args["filename"] = check_file.name
-            partial_check_args["severity"] = 90 if not optional else 50
-        else:
-            partial_check_args["debug_message"] = f"{check_file.name} exists"
-            partial_check_args["full_path"] = str(check_file.resolve())
-            partial_check_args["filename"] = check_file.name
-            partial_check_args["severity"] = 30
-        self.flag(**partial_check_args)
-
-    def _get_log_as_df(self):
-        return pd.read_csv(self._log_file,
-                           sep="\t",
-                           comment="#",
-                           names=FULL_LOG_HEADER,
-                           )
+        with self.measure(partial_check_args["check_id"]):
+            if not check_file.is_file():
+                partial_check_args["debug_message"] = f"{check_file.name} not found"
+                partial_check_args["full_path"] = str(check_file.resolve())
+                partial_check_args["filename"] = check_file.name
+                partial_check_args["severity"] = 90 if not optional else 50
+            else:
+                partial_check_args["debug_message"] = f"{check_file.name} exists"
+                partial_check_args["full_path"] = str(check_file.resolve())
+                partial_check_args["filename"] = check_file.name
+                partial_check_args["severity"] = 30
+            self.flag(**partial_check_args)
+
+    def _read_log_file(self, offset: int = 0) -> pd.DataFrame:
+        """ Parses the log file, from the byte offset if supplied """
+        with tracing.span("read log", "io", path = self._log_file, offset = offset), \
+             open_log(self._log_file, offset = offset) as f:
+            return pd.read_csv(f,
+                               sep="\t",
+                               comment="#",
+                               names=FULL_LOG_HEADER,
+                               )
+
+    def _get_log_as_df(self, this_run_only: bool = False):
+        """ Reads the full log, or only the lines written by this run """
+        # pending flags must be on disk before reading the log file
+        self.sync()
+        if self._sqlite:
+            return self._sqlite.read_log_df(run_ids = [self._sqlite.run_id] if this_run_only else None)
+        return self._read_log_file(offset = self._run_offset if this_run_only else 0)
+
+    def count_flags(self, check_id: str, flag_ids: list = None) -> int:
+        """ Number of flags for a check_id in this run, optionally only those with the given flag_ids
+        """
+        if self._sqlite:
+            self.flush()
+            return (self._sqlite.count_flags(check_id, flag_ids, run_ids = [self._sqlite.run_id]) +
+                    self._store.count_counted(check_id, flag_ids))
+        return self._store.count(check_id, flag_ids)
 
     def check_sample_proportions(self,
                                  check_args: dict,
                                  check_cutoffs: dict,
                                  protoflag_map: dict):
-        df = self._get_log_as_df()
-        # filter by check_id
-        checkdf = df.loc[df["check_id"] == check_args["check_id"]]
-
-        check_args["entity"] = "All_Samples"
-
-        # compute proportion with proto flags
-        flagged = False
-        for flag_id in sorted(protoflag_map, reverse=True):
-            threshold = check_cutoffs["sample_proportion_thresholds"][flag_id]
-            valid_proto_ids = [str(id) for id in protoflag_map[flag_id]]
-            valid_proto_count = len(checkdf.loc[checkdf["flag_id"].isin(valid_proto_ids)])
-            total_count = len(checkdf)
-            proportion = valid_proto_count / total_count
-            # check if exceeds threshold
-            if proportion > threshold:
+        with self.measure(check_args["check_id"]):
+            check_args["entity"] = "All_Samples"
+
+            # compute proportion with proto flags
+            flagged = False
+            total_count = self.count_flags(check_args["check_id"])
+            for flag_id in sorted(protoflag_map, reverse=True):
+                threshold = check_cutoffs["sample_proportion_thresholds"][flag_id]
+                valid_proto_count = self.count_flags(check_args["check_id"], protoflag_map[flag_id])
+                proportion = valid_proto_count / total_count
+                # check if exceeds threshold
+                if proportion > threshold:
+                    check_args["debug_message"] = (f"{proportion*100}% of samples:files "
+                              f"({valid_proto_count} of {total_count}) "
+                              f"meet criteria for flagging. [threshold: {threshold*100}%]"
+                              )
+                    check_args["severity"] = flag_id
+                    self.flag(**check_args)
+                    flagged = True
+                    break
+
+            if not flagged:
                 check_args["debug_message"] = (f"{proportion*100}% of samples:files "
-                          f"({valid_proto_count} of {total_count}) "
-                          f"meet criteria for flagging. [threshold: {threshold*100}%]"
-                          )
-                check_args["severity"] = flag_id
+                                               f"({valid_proto_count} of {total_count}) "
+                                               f" does not meet criteria for flagging. [threshold: {threshold*100}%]"
+                                               )
+                check_args["severity"] = 30
                 self.flag(**check_args)
-                flagged = True
-                break
-
-        if not flagged:
-            check_args["debug_message"] = (f"{proportion*100}% of samples:files "
-                                           f"({valid_proto_count} of {total_count}) "
-                                           f" does not meet criteria for flagging. [threshold: {threshold*100}%]"
-                                           )
-            check_args["severity"] = 30
-            self.flag(**check_args)
-
-    def generate_derivative_log(self, log_type: str, samples: list):
-        known_log_types = ["only-issues", "by-sample", "by-step", "all-by-entity"]
-        if log_type == "only-issues":
+
+    def _partition_by_sample(self, full_df: pd.DataFrame, samples: list) -> list:
+        """ Splits the log into one dataframe per sample with a single grouping pass
+
+        Rows match a sample if the sample (as a regex) is found in the row's sample
+        field, so this is only computed once per distinct sample field value.
+        """
+        parent_dir = self._log_folder / Path("bySample")
+        parent_dir.mkdir(exist_ok=True)
+        positions_by_value = full_df.groupby("sample", sort=False).indices
+        partitions = list()
+        for sample in samples:
+            pattern = re.compile(sample)
+            positions = [positions for value, positions in positions_by_value.items()
+                         if isinstance(value, str) and pattern.search(value)]
+            positions = np.sort(np.concatenate(positions)) if positions else list()
+            output = parent_dir / f"{sample}__{self._log_file.name}"
+            partitions.append((output, full_df.iloc[positions]))
+        return partitions
+
+    def _partition_by_step(self, full_df: pd.DataFrame) -> list:
+        """ Splits the log into one dataframe per step with a single grouping pass
+        """
+        parent_dir = self._log_folder / Path("byStep")
+        parent_dir.mkdir(exist_ok=True)
+        positions_by_step = full_df.groupby("step", sort=False).indices
+        partitions = list()
+        for step in full_df["step"].unique():
+            # remove spaces in step for filename
+            output = parent_dir / f"{step.replace(' ', '_')}__{self._log_file.name}"
+            partitions.append((output, full_df.iloc[positions_by_step[step]]))
+        return partitions
+
+    def _write_partitions(self, partitions: list, max_workers: int = None):
+        """ Writes derivative log partitions concurrently
+        """
+        def _write(partition):
+            output, derived_df = partition
+            derived_df.to_csv(output, index=False, sep="\t", na_rep="NA")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # consume to raise any exceptions from writer threads
+            list(executor.map(_write, partitions))
+        for output, _ in partitions:
+            print(f">>> Created {output.relative_to(self._cwd)}: Derived from {self._log_file.relative_to(self._cwd)}")
+
+    @staticmethod
+    def _write_entity_report(derived_df: pd.DataFrame, output: Path):
+        """ Writes the text report of issues by sample
+
+        Each sample's rows are numbered in log order, the first row of each sample is
+        skipped (this drops the log header line, parsed as a row under sample 'sample').
+        """
+        samples = derived_df["sample"]
+        position = derived_df.groupby("sample", sort=False, dropna=False).cumcount()
+        written = (position > 0) & samples.notna()
+        df = derived_df.loc[written]
+        position = position[written]
+
+        user_message = df["user_message"]
+        message = user_message.where(user_message == "", df["debug_message"]).astype(str)
+        sub_entity = df["sub_entity"].astype(str)
+        message_line = (position.astype(str) + ". " +
+                        ("(" + sub_entity + ") ").where(sub_entity != "nan", "") +
+                        message)
+        flag_ids = df["flag_id"]
+        flag_levels = flag_ids.map({flag_id: FLAG_LEVELS[int(flag_id)] for flag_id in flag_ids.unique()})
+        details_line = ("Severity: " + flag_levels.astype(str) + " (" + flag_ids.astype(str) + ")" +
+                        "  CheckID: " + df["check_id"].astype(str))
+        lines = "  " + message_line + "\n    " + details_line + "\n\n"
+        lines_by_sample = lines.groupby(df["sample"], sort=False).agg("".join)
+
+        with open(output, "w") as f:
+            # iterate by unique entities
+            for entity in samples.unique():
+                f.write(f"SAMPLE: {entity}\n")
+                f.write(lines_by_sample.get(entity, ""))
+
+    @staticmethod
+    def _write_summary(full_df: pd.DataFrame, output: Path, counted_df: pd.DataFrame = None):
+        """ Writes the percent of samples with red and yellow warnings for each step and for any step ('any')
+
+        Percents are of distinct samples in the log, excluding 'All_Samples' and the
+        log header line (parsed as a row).  The header line's step, 'step', is
+        reported as 'any'.  Flags counted rather than logged (counted_df, see
+        persist_min_severity) are included, steps only found in counted_df are
+        reported after the steps in the log.
+        """
+        flags_df = full_df[["step", "severity", "sample"]]
+        if counted_df is not None and not counted_df.empty:
+            flags_df = pd.concat([flags_df.astype(object), counted_df[["step", "severity", "sample"]].astype(object)],
+                                 ignore_index=True)
+        single_sample_df = flags_df.loc[~flags_df["sample"].isin(["All_Samples","sample"])]
+        total_samples = single_sample_df["sample"].nunique(dropna=False)
+        warnings = single_sample_df.loc[single_sample_df["severity"].isin(["Warning-Red", "Warning-Yellow"]),
+                                        ["step", "severity", "sample"]]
+        # distinct samples per (step, severity), single grouping pass
+        distinct = warnings.groupby(["step", "severity", "sample"], dropna=False, sort=False).size().reset_index()
+        any_counts = distinct.drop_duplicates(["severity", "sample"]).groupby("severity", sort=False).size().to_dict()
+        # rows without a step are only counted for 'any'
+        counts = distinct.loc[distinct["step"].notna()].groupby(["step", "severity"], sort=False).size().to_dict()
+
+        with open(output, "w") as f:
+            # write header
+            f.write(f"Step\tPercent_Samples_Red_Warning\tPercent_Samples_Yellow_Warning\n")
+            for step in flags_df["step"].unique():
+                if step == "step":
+                    step = "any"
+                if total_samples == 0:
+                    f.write(f"{step}\t{'Not assessed: No single sample flags for this step found'}\t{'Not assessed: No single sample flags for this step found'}\n")
+                    continue
+                if step == "any":
+                    red, yellow = any_counts.get("Warning-Red", 0), any_counts.get("Warning-Yellow", 0)
+                else:
+                    red, yellow = counts.get((step, "Warning-Red"), 0), counts.get((step, "Warning-Yellow"), 0)
+                f.write(f"{step}\t{red / total_samples * 100:.2f}\t{yellow / total_samples * 100:.2f}\n")
+
+    def _read_counted_flags(self) -> pd.DataFrame:
+        """ Flags counted rather than logged (see persist_min_severity), None if there are none
+
+        Read from the counted flags table beside the log, with counts not yet written to it
+        """
+        counted = list()
+        output = self._log_folder / f"counted__{self._log_file.name}"
+        if output.is_file():
+            with open_log(output) as f:
+                counted.append(pd.read_csv(f, sep="\t"))
+        if self._store.counted:
+            counted.append(pd.DataFrame([[*key, count] for key, count in self._store.counted.items()],
+                                        columns=COUNTED_FLAGS_HEADER))
+        return pd.concat(counted, ignore_index=True) if counted else None
+
+    def generate_derivative_log(self, log_type: str, samples: list, full_df: pd.DataFrame = None):
+        """ Generates derivative logs from the full log
+
+        The 'all' log_type reads the full log once and generates every derivative log from it,
+        for callers that do not stream derivative logs (the mains stream them, see
+        add_streaming_derivative_logs, and only generate 'all-by-entity').
+        With memory profiling or tracing, generation is profiled/traced as a step and added
+        to the step memory table and trace.
+        """
+        if self._in_derivative_step:
+            return self._generate_derivative_log(log_type, samples, full_df)
+        step = f"Derivative Logs: {log_type}"
+        self._in_derivative_step = True
+        if self._step_memory:
+            self._step_memory.begin(step)
+        span = tracing.begin_span(step, "step")
+        try:
+            return self._generate_derivative_log(log_type, samples, full_df)
+        finally:
+            self._in_derivative_step = False
+            tracing.end_span(span)
+            if self._step_memory:
+                self._step_memory.stop()
+                self._write_step_memory_table()
+            if self._trace:
+                self._write_trace()
+
+    def _generate_derivative_log(self, log_type: str, samples: list, full_df: pd.DataFrame = None):
+        known_log_types = ["only-issues", "by-sample", "by-step", "all-by-entity", "all"]
+        if full_df is None and log_type in known_log_types:
             full_df = self._get_log_as_df()
+        if log_type == "all":
+            self.generate_derivative_log("only-issues", samples, full_df = full_df)
+            self._write_partitions(self._partition_by_sample(full_df, samples) +
+                                   self._partition_by_step(full_df))
+            self.generate_derivative_log("all-by-entity", samples, full_df = full_df)
+
+        elif log_type == "only-issues":
             output = self._log_folder / f"{log_type}__{self._log_file.name}"
             filter_out = [severity for flag_code, severity
                           in FLAG_LEVELS.items()
@@ -307,32 +1043,12 @@ class _Flagger():
 
 
         elif log_type == "by-sample":
-            full_df = self._get_log_as_df()
-            parent_dir = self._log_folder / Path("bySample")
-            parent_dir.mkdir(exist_ok=True)
-            for sample in samples:
-                output = parent_dir / f"{sample}__{self._log_file.name}"
-                derived_df = full_df.loc[full_df["sample"].str.contains(sample)]
-                derived_df.to_csv(output, index=False, sep="\t", na_rep="NA")
-                print(f">>> Created {output.relative_to(self._cwd)}: Derived from {self._log_file.relative_to(self._cwd)}")
-
-
+            self._write_partitions(self._partition_by_sample(full_df, samples))
 
         elif log_type == "by-step":
-            full_df = self._get_log_as_df()
-            parent_dir = self._log_folder / Path("byStep")
-            parent_dir.mkdir(exist_ok=True)
-            for step in full_df["step"].unique():
-                # remove spaces in step for filename
-                output = parent_dir / f"{step.replace(' ', '_')}__{self._log_file.name}"
-                derived_df = full_df.loc[full_df["step"] == step]
-                derived_df.to_csv(output, index=False, sep="\t", na_rep="NA")
-                print(f">>> Created {output.relative_to(self._cwd)}: Derived from {self._log_file.relative_to(self._cwd)}")
-
-
+            self._write_partitions(self._partition_by_step(full_df))
 
         elif log_type == "all-by-entity":
-            full_df = self._get_log_as_df()
             output = self._log_folder / f"all-by-sample.tsv"
             filter_out = [severity for flag_code, severity
                           in FLAG_LEVELS.items()
@@ -341,68 +1057,12 @@ class _Flagger():
             derived_df = full_df.loc[~full_df["severity"].isin(filter_out)]
 
             # create derived report message
-            def _make_report(row):
-                #sub_entity_repr = f"({row['sub_entity']})" if row['sub_entity'] != "nan" else ""
-                return f"[{row['severity']}] {row['user_message']}"
-            derived_df["report"] = derived_df.apply(_make_report, axis="columns")
-            # only use columns
-            #derived_df = derived_df[["check_id","sample","report"]]
-            #derived_df = derived_df.drop_duplicates()
-            with open(output.with_suffix('.txt'), "w") as f:
-                # iterate by unique entities
-                for entity in derived_df["sample"].unique():
-                    entity_df = derived_df.loc[derived_df["sample"] == entity]
-                    f.write(f"SAMPLE: {entity}\n")
-                    for i, (_, row) in enumerate(entity_df.iterrows()):
-                        if i == 0:
-                            continue # skip header
-                        #print(row['sub_entity'], type(row['sub_entity']))
-                        #print(f"ROW:  {row['user_message']} {type( row['user_message'])}")
-                        message = row['user_message'] if not row['user_message'] != "" else row['debug_message']
-                        message_line = f"{i}. ({row['sub_entity']}) " if str(row["sub_entity"]) != "nan" else f"{i}. "
-                        message_line += message
-                        details_line = f"Severity: {FLAG_LEVELS[int(row['flag_id'])]} ({row['flag_id']})  CheckID: {row['check_id']}"
-                        f.write(f"  {message_line}\n    {details_line}\n\n")
+            derived_df["report"] = "[" + derived_df["severity"].astype(str) + "] " + derived_df["user_message"].astype(str)
+            self._write_entity_report(derived_df, output.with_suffix('.txt'))
             print(f">>> Created {output.with_suffix('.txt').relative_to(self._cwd)}: Derived from {self._log_file.relative_to(self._cwd)}")
 
-
-            '''# create summary table for percentage of samples in certain flag categories
-            red_filter = derived_df["severity"] == "Warning-Red"
-            red_tally_df = derived_df.loc[red_filter].groupby(by=['sample','step']).agg('count')["severity"]
-            yellow_filter = derived_df["severity"] == "Warning-Yellow"
-            yellow_tally_df = derived_df.loc[yellow_filter].groupby(by=['sample','step']).agg('count')["severity"]
-            '''
-
-            # create summary of percentages
-            # adds in "All_Samples" to each set before subtracting it
-            def _percent_flagged(step, df):
-                # skip this
-                red_filter = df["severity"] == "Warning-Red"
-                yellow_filter = df["severity"] == "Warning-Yellow"
-                total_samples = len(df["sample"][~df["sample"].isin(["All_Samples","sample"])].unique())
-                if total_samples == 0:
-                    return None
-                if step == "any":
-                    percent_red_samples = len(df.loc[red_filter]["sample"][~df["sample"].isin(["All_Samples","sample"])].unique()) / total_samples * 100
-                    percent_yellow_samples = len(df.loc[yellow_filter]["sample"][~df["sample"].isin(["All_Samples","sample"])].unique()) / total_samples * 100
-                    return (percent_red_samples, percent_yellow_samples)
-                else:
-                    step_filter = (df["step"] == step)
-                    percent_red_samples = len(df.loc[red_filter & step_filter]["sample"][~df["sample"].isin(["All_Samples","sample"])].unique()) / total_samples * 100
-                    percent_yellow_samples = len(df.loc[yellow_filter & step_filter]["sample"][~df["sample"].isin(["All_Samples","sample"])].unique()) / total_samples * 100
-                    return (percent_red_samples, percent_yellow_samples)
-
             output_summary = self._log_folder /"Summary.tsv"
-            with open(output_summary, "w") as f:
-                # write header
-                f.write(f"Step\tPercent_Samples_Red_Warning\tPercent_Samples_Yellow_Warning\n")
-                for step in full_df["step"].unique():
-                    if step == "step":
-                        step = "any"
-                    if percents := _percent_flagged(step, full_df):
-                        f.write(f"{step}\t{percents[0]:.2f}\t{percents[1]:.2f}\n")
-                    else:
-                        f.write(f"{step}\t{'Not assessed: No single sample flags for this step found'}\t{'Not assessed: No single sample flags for this step found'}\n")
+            self._write_summary(full_df, output_summary, counted_df = self._read_counted_flags())
             print(f">>> Created {output_summary.relative_to(self._cwd)}: Derived from {self._log_file.relative_to(self._cwd)}")
 
 
@@ -422,40 +1082,107 @@ class _Flagger():
         else:
             raise ValueError(f"{log_type} not implemented.  Try from {known_log_types}")
 
-    def _parse_debug_message_and_round_values_to_sigfig(self,
-                                                  debug_message,
-                                                  sigfigs = 2,
-                                                  ignore_ints = True):
-        def is_number(x):
-            try:
-                float(x)
-                return True
-            except ValueError:
-                return False
-        words = debug_message.split()
-        new_debug_message = list()
-        for i, word in enumerate(words):
-            # also catch values that look like this
-            # [value: 52.0000000] <- notice the trailing square bracket!
-            if word[-1] == "]":
-                hasTrailingBracket = True
-                word = word[:-1] # remove temporarily
-            else:
-                hasTrailingBracket = False
 
-            # round numeric values to sigfigs
-            is_int = "." not in word
-            if is_number(word) and not all([ignore_ints, is_int]):
-                original_value = float(word)
-                rounded_value = round(original_value, sigfigs - int(math.floor(math.log10(abs(original_value)))) - 1)
-                word = str(rounded_value)
+# flag arguments, used to check flag_many results
+FLAG_ARGUMENTS = [name for name in inspect.signature(_Flagger.flag).parameters if name != "self"]
+FLAG_REQUIRED_ARGUMENTS = [name for name, parameter in inspect.signature(_Flagger.flag).parameters.items()
+                           if name != "self" and parameter.default is inspect.Parameter.empty]
 
-            # add back square bracket if removed
-            if hasTrailingBracket:
-                word += "]"
-            new_debug_message.append(word)
-        return " ".join(new_debug_message)
+class FlaggerFork(_Flagger):
+    """ A flagger holding flags in memory for merging into its parent flagger (see _Flagger.fork)
+    """
+    # used by one task at a time, no lock needed (and forks stay picklable)
+    _lock = nullcontext()
 
+    def __init__(self, parent: _Flagger, step: str, script: str):
+        self._cwd = parent._cwd
+        self._flag_dict = defaultdict(int)
+        self._script = script
+        self._step = step
+        self._severity = parent._severity
+        self._halt_level = parent._halt_level
+        self.derivatives = list()
+        self.sinks = list()
+        self._sqlite = None
+        self._flag_count = 0
+        self._store = FlagStore()
+        self._check_timings = CheckTimings()
+        self._step_memory = None
+        self._step_span = None
+        # every flag is stored, the parent applies persist_min_severity when merging
+        self._persist_min_severity = None
+        self._flush_every = parent._flush_every
+        self.timestamp = parent.timestamp
+        # forks have no log file or outputs of their own
+        self._log_file = None
+        self._log_folder = None
+        self._log_handle = None
+        self._appending = False
+        self._run_offset = 0
+        self._write_header = False
+        self._background_writes = False
+        self._writer = None
+        self._write_check_timings = False
+        self._trace = False
+        self._trace_id = None
+        self._in_derivative_step = False
+
+    def flush(self):
+        """ Forks do not write, flags are written when merged """
+        pass
+
+    def close(self):
+        pass
+
+    def _no_log_file(self, *args, **kwargs):
+        raise ValueError("Flagger forks do not have a log file, use the fork's df or merge the fork into its parent flagger")
+
+    _get_log_as_df = _no_log_file
+    generate_derivative_log = _no_log_file
+    add_streaming_derivative_logs = _no_log_file
+
+    def _emit(self, record: FlagRecord, merged: bool = False):
+        self._check_timings.flagged(record.check_id, record.step)
+        self._flag_count += 1
+        self._flag_dict[record.flag_id] += 1
+        self._store.append(record)
+        if record.flag_id >= self._halt_level:
+            raise VVError(f"SEVERE ISSUE, HALTING V-V AND ANY ADDITIONAL PROCESSING\nHalting flag message: '{record.debug_message}'")
+
+def _run_with_fork(function: Callable, fork: FlaggerFork, kwargs: dict):
+    """ Runs a task with its fork, returning the fork (with its flags) to the calling process """
+    try:
+        return fork, function(flagger = fork, **kwargs), None
+    except Exception as e:
+        return fork, None, e
+
+def run_forked(flagger: _Flagger, tasks: list, executor: Executor = None) -> list:
+    """ Runs tasks concurrently, each with its own fork of the flagger, and merges their flags in task order
+
+    :param tasks: list of (function, step, kwargs), functions are called as function(flagger = fork, **kwargs)
+    :param executor: a concurrent.futures executor, defaults to a ThreadPoolExecutor.  For a ProcessPoolExecutor
+        functions and kwargs must be picklable
+    :returns: the return value of each task
+
+    The merged log, counters and halting match running the tasks one after another:
+    flags are merged task by task, a halting flag raises the VVError once flags up
+    to it are merged and any other exception is raised once the flags the task
+    logged before it are merged.  Flags from later tasks are not merged in either case.
+    """
+    if executor is None:
+        with ThreadPoolExecutor() as thread_executor:
+            return run_forked(flagger, tasks, executor = thread_executor)
+    forks = [flagger.fork(step = step) for _, step, _ in tasks]
+    futures = [executor.submit(_run_with_fork, function, fork, kwargs)
+               for (function, _, kwargs), fork in zip(tasks, forks)]
+    results = list()
+    for future in futures:
+        fork, result, error = future.result()
+        flagger.merge([fork])
+        if error is not None:
+            raise error
+        results.append(result)
+    return results
 
 class NullFlagger(_Flagger):
     """ A flagger that does not write output
@@ -465,50 +1192,27 @@ class NullFlagger(_Flagger):
 
 _instance = None
 
+# flaggers with possibly unwritten flags, closed at interpreter exit
+# held until closed, a flagger that is no longer referenced elsewhere still has its flags written
+_open_flaggers = set()
+
+@atexit.register
+def _close_open_flaggers():
+    for flagger in list(_open_flaggers):
+        flagger.close()
+
 def Flagger(**kwargs):
+    """ Returns the module level flagger, created on first call or if 'force_new_flagger' is set
+
+    With 'independent' set, a new flagger is returned without replacing the module
+    level flagger, for validating several datasets in one process.
+    """
     global _instance
+    if kwargs.pop("independent", False):
+        kwargs.pop("force_new_flagger", None)
+        return _Flagger(**kwargs)
     if not _instance or kwargs.get("force_new_flagger"):
         if kwargs.get("force_new_flagger"):
             kwargs.pop("force_new_flagger")
         _instance = _Flagger(**kwargs)
     return _instance
-
-def check(flagger: _Flagger, 
-          return_interactions: dict,
-          check_id: str = "not suppied",
-          full_path: str = "not supplied",
-          file_name: str = "not supplied",
-          entity: str = "not supplied"):
-    """ Generic check that generates flags based on output from a function """
-    code = 0
-    def inner_function(function: Callable):
-        @wraps(function)
-        def wrapper(*args, **kwargs):
-            try:
-                result = function(*args, **kwargs)
-                print(code)
-                severity, formatter = return_interactions.get(code, None)
-                debug_message = formatter(result)
-                if response == None:
-                    # i.e. function ran but response not programmed
-                    severity = 94
-                    debug_message = f"Check function: {function} returned, but check doesn't know how to handle returned result: {result}"
-            except Exception as e:
-                raise e
-                # uncaught issues are flagged
-                severity = 95
-                debug_message = f"Unhandled Exception: {e}, refer to V&V developer"
-            flagger.flag(check_id=check_id, 
-                         full_path=full_path, 
-                         debug_message=debug_message, 
-                         filename=file_name,
-                         severity=severity, 
-                         entity=entity)
-        
-        return wrapper
-    return inner_function
-
-def init_check(flagger):
-    """ Returns a check decorator with a supplied flagger object attached """
-    
-    return partial(check, flagger=flagger)
@@ -0,0 +1,309 @@
+""" Additional output formats for the full VV log
+
+The full log is always written as a TSV.  These sinks additionally write the
+flags as Parquet or Arrow IPC, one row group/record batch per flush, or into
+a SQLite database, one transaction per flush.
+
+Appended runs cannot extend an existing Parquet/Arrow file, so each format is
+written as a directory next to the TSV log (e.g. VV_log.parquet/) holding one
+part file per run.  Parquet directories can be read directly with
+pandas.read_parquet, read_columnar_log reads either format.
+
+Parquet/Arrow require pyarrow (optional dependency), SQLite uses the
+standard library sqlite3 module.
+"""
+import math
+import sqlite3
+from collections import namedtuple
+from typing import Callable
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from VV.flag_messages import message_text
+
+# columns stored dictionary encoded (and interned in memory by the flag store), these have few distinct values
+DICTIONARY_COLUMNS = ["sample", "severity", "step", "script", "check_id", "filename", "full_path"]
+
+class EncodedColumn(namedtuple("EncodedColumn", ["codes", "dictionary"])):
+    """ A dictionary encoded column, codes (integer array) index into dictionary (list of values) """
+    __slots__ = ()
+
+    def decode(self) -> list:
+        dictionary = self.dictionary
+        return [dictionary[code] for code in self.codes]
+
+def _decoded(values) -> list:
+    """ Column values as a list, decoding an EncodedColumn """
+    if isinstance(values, EncodedColumn):
+        return values.decode()
+    return values
+
+def _text_value(value):
+    """ Converts a log value to text as written in the TSV log, empty values as null """
+    value = message_text(value)
+    if value is None or value == "" or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return str(value)
+
+class ColumnarLogSink():
+    """ Base for columnar full log writers
+
+    Subclasses implement '_open_writer' and '_write_table'
+    """
+    suffix = None
+
+    def __init__(self, log_file: Path, header: list, run_label: str):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(f"pyarrow is required to write the VV log as {self.suffix[1:]}. Install with 'pip install pyarrow'")
+        self._pa = pa
+        self.header = header
+        self.folder = log_file.with_suffix(self.suffix)
+        self.folder.mkdir(exist_ok=True, parents=True)
+        self._run_label = run_label
+        self._part = 0
+        self._writer = None
+        fields = list()
+        for column in header:
+            if column == "flag_id":
+                fields.append(pa.field(column, pa.int64()))
+            elif column in DICTIONARY_COLUMNS:
+                fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+            else:
+                fields.append(pa.field(column, pa.string()))
+        self.schema = pa.schema(fields)
+
+    @property
+    def path(self) -> Path:
+        part = f"-{self._part}" if self._part else ""
+        return self.folder / f"run-{self._run_label}{part}{self.suffix}"
+
+    def _to_table(self, columns: dict):
+        pa = self._pa
+        arrays = list()
+        for field in self.schema:
+            values = columns[field.name]
+            if isinstance(values, EncodedColumn) and field.name in DICTIONARY_COLUMNS:
+                arrays.append(self._dictionary_array(values))
+            elif field.name == "flag_id":
+                arrays.append(pa.array(_decoded(values), type=pa.int64()))
+            else:
+                values = _decoded(values)
+                array = pa.array([_text_value(value) for value in values], type=pa.string())
+                if field.name in DICTIONARY_COLUMNS:
+                    array = array.dictionary_encode()
+                arrays.append(array)
+        return pa.Table.from_arrays(arrays, schema=self.schema)
+
+    def _dictionary_array(self, column: EncodedColumn):
+        """ Converts an interned column to an arrow dictionary array without decoding each value
+
+        Dictionary values are converted to text, values that are empty (null) or
+        equal as text (e.g. a path and the same path as a string) are merged.
+        """
+        pa = self._pa
+        distinct = dict()
+        texts = (_text_value(value) for value in column.dictionary)
+        remap = np.array([-1 if text is None else distinct.setdefault(text, len(distinct)) for text in texts],
+                         dtype=np.int32)
+        indices = remap[column.codes] if len(column.codes) else np.empty(0, dtype=np.int32)
+        return pa.DictionaryArray.from_arrays(pa.array(indices, mask=indices < 0, type=pa.int32()),
+                                              pa.array(list(distinct), type=pa.string()))
+
+    def write_batch(self, columns: dict):
+        """ Writes one batch of rows, given as full log columns """
+        if self._writer is None:
+            self._writer = self._open_writer(self.path)
+        self._write_table(self._to_table(columns))
+
+    def close(self):
+        """ Finalizes the current part file, further batches start a new part """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._part += 1
+
+    def _open_writer(self, path: Path):
+        raise NotImplementedError
+
+    def _write_table(self, table):
+        raise NotImplementedError
+
+class ParquetLogSink(ColumnarLogSink):
+    """ Writes the full log as Parquet, one row group per flush
+    """
+    suffix = ".parquet"
+
+    def _open_writer(self, path: Path):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(path, self.schema)
+
+    def _write_table(self, table):
+        self._writer.write_table(table, row_group_size=table.num_rows)
+
+class ArrowLogSink(ColumnarLogSink):
+    """ Writes the full log as an Arrow IPC stream, one record batch per flush
+
+    The stream format is used as each batch carries its own dictionaries.
+    """
+    suffix = ".arrows"
+
+    def _open_writer(self, path: Path):
+        return self._pa.ipc.new_stream(path, self.schema)
+
+    def _write_table(self, table):
+        self._writer.write_table(table)
+
+LOG_FORMATS = {
+    "parquet": ParquetLogSink,
+    "arrow": ArrowLogSink,
+}
+
+def read_columnar_log(path: Path) -> pd.DataFrame:
+    """ Reads a Parquet or Arrow log directory (or single part file) as a dataframe
+    """
+    import pyarrow as pa
+    path = Path(path)
+    parts = sorted(path.glob("run-*")) if path.is_dir() else [path]
+    tables = list()
+    for part in parts:
+        if part.suffix == ArrowLogSink.suffix:
+            with pa.ipc.open_stream(part) as reader:
+                tables.append(reader.read_all())
+        else:
+            import pyarrow.parquet as pq
+            tables.append(pq.read_table(part))
+    table = pa.concat_tables(tables) if tables else pa.table({})
+    return table.to_pandas()
+
+class SqliteLogSink():
+    """ Writes the full log into a SQLite database, one transaction per flush
+
+    A database can hold many runs, from one or many logs.  Each flagger
+    instance adds a row to the 'runs' table and its flags to the 'flags'
+    table under that run_id.  Flags are indexed on (check_id, sample, severity).
+
+    Runs are recorded with the TSV log they belong to, identified by its path
+    and start time (log_started), and the byte offsets in the TSV where each
+    run starts and ends.  If the recorded runs do not account for the TSV up to
+    where this run starts (i.e. the TSV was recreated, or appended to without
+    the database), the log's recorded runs are dropped and the flags in the TSV
+    are read (read_history, returning the log as a dataframe) and imported as
+    their own run first.
+    """
+    def __init__(self, db_path: Path, header: list, log_file: Path, run_label: str, command: str,
+                 read_history: Callable = None, log_started: str = None, start_offset: int = 0):
+        self.db_path = Path(db_path)
+        self.header = header
+        self.log_file = str(log_file)
+        self.log_started = log_started
+        self.db_path.parent.mkdir(exist_ok=True, parents=True)
+        self._connection = None
+        self._insert = (f"INSERT INTO flags (run_id, row_number, {', '.join(header)}) "
+                        f"VALUES ({', '.join('?' * (len(header) + 2))})")
+        columns = ", ".join(f"{column} INTEGER" if column == "flag_id" else f"{column} TEXT" for column in header)
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS runs "
+                               "(run_id INTEGER PRIMARY KEY, log_file TEXT, run_label TEXT, started TEXT, command TEXT, "
+                               "log_started TEXT, start_offset INTEGER, end_offset INTEGER)")
+            # databases written before runs were located in the TSV
+            run_columns = [row[1] for row in connection.execute("PRAGMA table_info(runs)")]
+            for column, column_type in [("log_started", "TEXT"), ("start_offset", "INTEGER"), ("end_offset", "INTEGER")]:
+                if column not in run_columns:
+                    connection.execute(f"ALTER TABLE runs ADD COLUMN {column} {column_type}")
+            connection.execute(f"CREATE TABLE IF NOT EXISTS flags (run_id INTEGER, row_number INTEGER, {columns})")
+            connection.execute("CREATE INDEX IF NOT EXISTS flags_check_sample_severity ON flags (check_id, sample, severity)")
+            connection.execute("CREATE INDEX IF NOT EXISTS flags_run ON flags (run_id, row_number)")
+            runs = connection.execute("SELECT log_started, end_offset FROM runs WHERE log_file = ? ORDER BY run_id",
+                                      (self.log_file,)).fetchall()
+            recorded_end = runs[-1][1] if runs else 0
+            in_sync = all(started == log_started for started, _ in runs) and recorded_end == start_offset
+            if not in_sync:
+                connection.execute("DELETE FROM flags WHERE run_id IN (SELECT run_id FROM runs WHERE log_file = ?)",
+                                   (self.log_file,))
+                connection.execute("DELETE FROM runs WHERE log_file = ?", (self.log_file,))
+        if not in_sync and start_offset and read_history is not None:
+            history_df = read_history()
+            # drops the header line, parsed as a row
+            history_df = history_df.loc[pd.to_numeric(history_df["flag_id"], errors="coerce").notna()]
+            self._start_run("imported", "imported from existing log", start_offset = 0)
+            self.write_batch({column: history_df[column].tolist() for column in header})
+            self._end_run(end_offset = start_offset)
+        self._start_run(run_label, command, start_offset = start_offset)
+
+    def _connect(self):
+        if self._connection is None:
+            # flushes may come from any thread, serialized by the flagger
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._connection
+
+    def _start_run(self, run_label: str, command: str, start_offset: int):
+        with self._connect() as connection:
+            self.run_id = connection.execute("INSERT INTO runs (log_file, run_label, started, command, log_started, start_offset) "
+                                             "VALUES (?, ?, ?, ?, ?, ?)",
+                                             (self.log_file, run_label, datetime.now().isoformat(), command,
+                                              self.log_started, start_offset)).lastrowid
+        self._rows_written = 0
+
+    def _end_run(self, end_offset: int):
+        """ Records where the run ends in the TSV log """
+        with self._connect() as connection:
+            connection.execute("UPDATE runs SET end_offset = ? WHERE run_id = ?", (end_offset, self.run_id))
+
+    def write_batch(self, columns: dict):
+        """ Writes one batch of rows, given as full log columns """
+        values = [[int(value) for value in _decoded(columns[column])] if column == "flag_id"
+                  else [_text_value(value) for value in _decoded(columns[column])]
+                  for column in self.header]
+        rows = [(self.run_id, self._rows_written + i, *row) for i, row in enumerate(zip(*values))]
+        with self._connect() as connection:
+            connection.executemany(self._insert, rows)
+        self._rows_written += len(rows)
+
+    def log_run_ids(self) -> list:
+        """ run_ids of every run written for this sink's log file, oldest first """
+        rows = self._connect().execute("SELECT run_id FROM runs WHERE log_file = ? ORDER BY run_id", (self.log_file,))
+        return [run_id for run_id, in rows]
+
+    def count_flags(self, check_id: str, flag_ids: list = None, run_ids: list = None) -> int:
+        """ Number of flags for a check_id, optionally only those with the given flag_ids
+
+        Defaults to every run for this sink's log file.
+        """
+        run_ids = self.log_run_ids() if run_ids is None else run_ids
+        query = (f"SELECT COUNT(*) FROM flags WHERE check_id = ? "
+                 f"AND run_id IN ({', '.join('?' * len(run_ids))})")
+        params = [check_id, *run_ids]
+        if flag_ids is not None:
+            query += f" AND flag_id IN ({', '.join('?' * len(flag_ids))})"
+            params.extend(flag_ids)
+        return self._connect().execute(query, params).fetchone()[0]
+
+    def read_df(self, run_ids: list = None) -> pd.DataFrame:
+        """ Flags in full log column order.  Defaults to every run for this sink's log file """
+        run_ids = self.log_run_ids() if run_ids is None else run_ids
+        query = (f"SELECT {', '.join(self.header)} FROM flags "
+                 f"WHERE run_id IN ({', '.join('?' * len(run_ids))}) ORDER BY run_id, row_number")
+        return pd.read_sql_query(query, self._connect(), params=run_ids)
+
+    def read_log_df(self, run_ids: list = None) -> pd.DataFrame:
+        """ Flags as they would be parsed from the TSV log by _Flagger._get_log_as_df
+
+        i.e. text values with 'NA' and empty values as NaN and the header line as the first row
+        """
+        df = self.read_df(run_ids).astype(object)
+        df["flag_id"] = df["flag_id"].astype(str)
+        df = df.where(df.notna() & (df != "NA"), np.nan)
+        header_row = pd.DataFrame([self.header], columns=self.header)
+        return pd.concat([header_row, df], ignore_index=True)
+
+    def close(self):
+        """ Records where the run ends in the (finished) TSV log and closes the database """
+        if self._connection is not None:
+            self._end_run(end_offset = Path(self.log_file).stat().st_size)
+            self._connection.close()
+            self._connection = None
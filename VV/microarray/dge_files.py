@@ -4,6 +4,7 @@ from pathlib import Path
 import pandas as pd
 
 from VV.flagging import Flagger
+from VV.tracing import span
 from VV.utils import filevalues_from_mapping, value_based_checks
 
 
@@ -57,7 +58,8 @@ class DGEFilesVV():
 
 
     def _check_visualization_table(self, expectedFile, partial_check_args: dict):
-            visualization_df = pd.read_csv(expectedFile, index_col=None)
+            with span("read_csv", "io", path = expectedFile):
+                visualization_df = pd.read_csv(expectedFile, index_col=None)
             flagged = False
             # check all samples have a column
             missing_sample_cols = set(self.samples) - set(visualization_df.columns)
@@ -115,7 +117,8 @@ class DGEFilesVV():
 
        Also sets contrast groups
        """
-       contrasts_df = pd.read_csv(contrasts_file, index_col=0)
+       with span("read_csv", "io", path = contrasts_file):
+           contrasts_df = pd.read_csv(contrasts_file, index_col=0)
        self.factor_groups_versus = set(contrasts_df.columns)
        self.factor_groups = list()
        parsed_factor_groups = [group_versus.split("v") for group_versus in self.factor_groups_versus.copy()]
@@ -137,7 +140,8 @@ class DGEFilesVV():
            self.flagger.flag(**partial_check_args)
 
     def _check_dge_table(self, expectedFile, partial_check_args: dict):
-        dge_df = pd.read_csv(expectedFile, index_col=None)
+        with span("read_csv", "io", path = expectedFile):
+            dge_df = pd.read_csv(expectedFile, index_col=None)
         flagged = False
         # check all samples have a column
         missing_sample_cols = set(self.samples) - set(dge_df.columns)
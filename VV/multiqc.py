@@ -10,7 +10,14 @@ import argparse
 from pathlib import Path
 import gzip
 import json
-from statistics import stdev, median, mean
+import re
+from bisect import bisect_right
+from statistics import stdev, median, mean, StatisticsError
+
+import numpy as np
+
+from VV.tracing import span
+from VV.multiqc_cache import multiqc_cache
 
 @dataclass
 class Subset:
@@ -27,15 +34,264 @@ class OneValueData:
     units: str
     value: float
 
+
+class PlotMatrix():
+    """ Values of one XY line graph (file label and plot key) for all samples
+
+    Stored as a samples x bins float64 'matrix', with rows indexed by 'sample_index'
+    and columns by 'bin_index' (bins in the order first seen).  Bins a sample was
+    not plotted for are NaN in the matrix and False in 'present'.
+    """
+    def __init__(self, sample_bins_values: dict):
+        """ :param sample_bins_values: sample to (bins, values) for that sample, in plotted order """
+        self.sample_index = {sample: row for row, sample in enumerate(sample_bins_values)}
+        self.bin_index = dict()
+        # each sample's bins and their columns, in the sample's plotted order
+        self.sample_bins = dict()
+        self.columns = dict()
+        for sample, (bins, _) in sample_bins_values.items():
+            self.sample_bins[sample] = bins
+            self.columns[sample] = np.array([self.bin_index.setdefault(bin, len(self.bin_index)) for bin in bins],
+                                            dtype=np.intp)
+        self.bins = list(self.bin_index)
+        self.matrix = np.full((len(self.sample_index), len(self.bin_index)), np.nan)
+        self.present = np.zeros(self.matrix.shape, dtype=bool)
+        for sample, (_, values) in sample_bins_values.items():
+            row = self.sample_index[sample]
+            self.matrix[row, self.columns[sample]] = values
+            self.present[row, self.columns[sample]] = True
+
+    def values(self, sample: str) -> dict:
+        """ {bin: value} for a sample """
+        return dict(zip(self.sample_bins[sample], self.matrix[self.sample_index[sample], self.columns[sample]].tolist()))
+
+    def subset_columns(self, samples: list) -> list:
+        """ Columns plotted for any of the samples, in the order first plotted across the samples """
+        columns = dict()
+        for sample in samples:
+            columns.update(dict.fromkeys(self.columns[sample].tolist()))
+        return list(columns)
+
+    def zero_filled(self, samples: list, columns: list) -> np.ndarray:
+        """ samples x columns matrix, unplotted bins (and unplotted samples) are zero """
+        filled = np.zeros((len(samples), len(columns)))
+        rows = [(i, self.sample_index[sample]) for i, sample in enumerate(samples) if sample in self.sample_index]
+        if rows:
+            subset_rows, matrix_rows = map(list, zip(*rows))
+            plotted = self.matrix[np.ix_(matrix_rows, columns)]
+            filled[subset_rows] = np.where(self.present[np.ix_(matrix_rows, columns)], plotted, 0.0)
+        return filled
+
+
+class BinDeviations():
+    """ Standard deviations from the median for each sample and bin of a PlotMatrix
+
+    'stdevs_from_median' is a samples x bins matrix (rows in the order of 'samples',
+    columns the bins plotted for any of the samples).  Unplotted bins are zeros and
+    bins with a standard deviation of zero have no deviations.
+    """
+    def __init__(self, plot: PlotMatrix, plotted_samples: list, samples: list):
+        columns = plot.subset_columns(plotted_samples)
+        # line graphs that did not start at the origin
+        # (values of zero before a certain x value - e.g. length distribution plot)
+        # these do not have entries and are explicit zeros, as are unplotted samples
+        matrix = plot.zero_filled(samples, columns)
+        if len(samples) < 2:
+            raise StatisticsError("stdev requires at least two data points")
+        _median = np.median(matrix, axis=0)
+        _stdev = np.std(matrix, axis=0, ddof=1)
+        # bins with a standard deviation of zero have no outliers
+        varies = _stdev != 0
+        self.samples = samples
+        self.bins = [plot.bins[column] for column in columns]
+        self.stdevs_from_median = np.zeros(matrix.shape)
+        self.stdevs_from_median[:, varies] = np.abs(matrix[:, varies] - _median[varies]) / _stdev[varies]
+        self._rows = {sample: row for row, sample in enumerate(samples)}
+
+    def outlier_bins(self, sample: str, deviation: float) -> list:
+        """ Bins where the sample is more than 'deviation' standard deviations from the median, in bin order """
+        return [self.bins[i] for i in np.flatnonzero(self.stdevs_from_median[self._rows[sample]] > deviation)]
+
+
 @dataclass
 class IndexedValuesData:
     """ Representation of data for a single sample from a XY line graph
+
+    'values' ({bin: value}) is read from the graph's PlotMatrix
     """
     datakey: str
     units: str
     bins: list
     bin_units: str
-    values: dict
+    plot: PlotMatrix = field(repr=False)
+    sample: str = field(repr=False)
+
+    @property
+    def values(self) -> dict:
+        return self.plot.values(self.sample)
+
+
+class _FilenameIndex():
+    """ Finds the mapped files whose path contains a query file name
+
+    Mapped paths are joined into a single string built once, each query is
+    located with str.find and the file owning each hit is found by bisecting
+    the path start offsets, rather than scanning every sample and file label.
+    Matches are memoised by query as multiQC repeats each file name for every
+    general stats entry and plot.
+    """
+    SEPARATOR = "\0"
+
+    def __init__(self, file_mapping: dict):
+        self._owners = list() # (sample, filelabel) for each path
+        self._starts = list() # offset of each path in the joined string
+        paths = list()
+        offset = 0
+        for sample, file_map in file_mapping.items():
+            for filelabel, search_file in file_map.items():
+                path = str(search_file)
+                self._owners.append((sample, filelabel))
+                self._starts.append(offset)
+                paths.append(path)
+                offset += len(path) + len(self.SEPARATOR)
+        self._joined = self.SEPARATOR.join(paths)
+        self._matches = dict()
+
+    def matches(self, query: str) -> list:
+        """ (sample, filelabel) of each path containing query, in file mapping order """
+        matched = self._matches.get(query)
+        if matched is None:
+            matched = list()
+            # paths do not contain the separator
+            start = 0 if self.SEPARATOR not in query else len(self._joined) + 1
+            while (position := self._joined.find(query, start)) != -1:
+                path_index = bisect_right(self._starts, position) - 1
+                matched.append(self._owners[path_index])
+                # a path is matched once, continue from the next path
+                if path_index + 1 == len(self._starts):
+                    break
+                start = self._starts[path_index + 1]
+            self._matches[query] = matched
+        return matched
+
+
+class _JsonStream():
+    """ Reads selected values of a JSON document, scanning past the others
+
+    The file is read in chunks.  Skipped values are scanned for their end by
+    counting brackets between strings, without decoding them, so only the text
+    of values that are read (and the current chunk) is held in memory.
+    """
+    CHUNK_SIZE = 2**20
+    _WHITESPACE = re.compile(r"[ \t\n\r]*")
+    # from after an opening quote to the closing quote
+    _STRING_END = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"')
+    _SCALAR_END = re.compile(r"[,\]}\s]")
+
+    def __init__(self, f):
+        self._f = f
+        self._buffer = ""
+        self._pos = 0
+
+    def _read_more(self, keep: int):
+        """ Appends the next chunk, dropping text before keep """
+        chunk = self._f.read(self.CHUNK_SIZE)
+        if not chunk:
+            raise ValueError("Unexpected end of JSON document")
+        self._buffer = self._buffer[keep:] + chunk
+        self._pos -= keep
+
+    def _next_char(self) -> str:
+        """ Skips whitespace, returns the next character """
+        while True:
+            self._pos = self._WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            self._read_more(keep = self._pos)
+
+    def _expect(self, expected: str) -> str:
+        char = self._next_char()
+        if char not in expected:
+            raise ValueError(f"Expected one of '{expected}' in JSON document, found '{char}'")
+        self._pos += 1
+        return char
+
+    def _scan(self, capture: bool) -> str:
+        """ Moves past the next value, returning its text if capture """
+        self._next_char()
+        start = pos = self._pos
+        depth = 0
+        while True:
+            if pos >= len(self._buffer):
+                keep = start if capture else pos
+                self._pos = pos
+                self._read_more(keep)
+                pos, start = self._pos, start - keep
+                continue
+            char = self._buffer[pos]
+            if char == '"':
+                match = self._STRING_END.match(self._buffer, pos + 1)
+                if match is None: # continues in the next chunk, rescanned from the quote
+                    keep = start if capture else pos
+                    self._pos = pos
+                    self._read_more(keep)
+                    pos, start = self._pos, start - keep
+                    continue
+                pos = match.end()
+            elif depth == 0 and char not in "[{":
+                match = self._SCALAR_END.search(self._buffer, pos)
+                if match is None:
+                    keep = start if capture else pos
+                    self._pos = pos
+                    self._read_more(keep)
+                    pos, start = self._pos, start - keep
+                    continue
+                pos = match.start()
+            else:
+                # brackets up to the next string
+                end = self._buffer.find('"', pos)
+                end = len(self._buffer) if end == -1 else end
+                change = (self._buffer.count("[", pos, end) + self._buffer.count("{", pos, end)
+                          - self._buffer.count("]", pos, end) - self._buffer.count("}", pos, end))
+                if depth + change > 0:
+                    depth += change
+                    pos = end
+                else:
+                    # the value ends before the next string
+                    for pos in range(pos, end):
+                        char = self._buffer[pos]
+                        if char in "[{":
+                            depth += 1
+                        elif char in "]}":
+                            depth -= 1
+                            if depth == 0:
+                                break
+                    pos += 1
+            if depth == 0:
+                self._pos = pos
+                return self._buffer[start:pos] if capture else None
+
+    def members(self):
+        """ Iterates over the keys of the object at the current position
+
+        The value of each key must be read with value or skip before the next key
+        """
+        self._expect("{")
+        if self._next_char() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = json.loads(self._scan(capture = True))
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+
+    def value(self):
+        return json.loads(self._scan(capture = True))
+
+    def skip(self):
+        self._scan(capture = False)
 
 
 class MultiQC():
@@ -44,7 +300,11 @@ class MultiQC():
 
     def __init__(self, multiQC_json: Path,
                        file_mapping: dict,
-                       outlier_comparision_point: str = "median"):
+                       outlier_comparision_point: str = "median",
+                       plot_keys: list = None):
+        """ :param plot_keys: data keys of the plots to extract (e.g. 'fastqc_per_sequence_gc_content_plot-Percentages'),
+            other plots are skipped when reading the json.  If not given, all plots are extracted
+        """
         try:
             self.outlier_comparision = self.OUTLIER_COMPARISION[outlier_comparision_point]
         except KeyError:
@@ -52,9 +312,26 @@ class MultiQC():
         self.samples = list(file_mapping.keys())
         self.file_mapping = file_mapping
         self.file_labels = list(file_mapping[self.samples[0]].keys())
-
-        # extracts data from multiQC json file.
-        self.data = self._extract_multiQC_data(json_file = multiQC_json, samples = self.samples)
+        # built once, used to match multiQC file names to samples and file labels
+        self._filename_index = _FilenameIndex(file_mapping)
+        # bar graph sample name to the number of dataset samples it contains
+        self._bar_graph_sample_matches = dict()
+        self.plot_keys = plot_keys
+
+        # XY line graph values by data key (i.e. file label and plot), filled while extracting
+        self.plot_matrices = dict()
+        # BinDeviations by data key and samples, computed on first use
+        self._bin_deviations = dict()
+        # extracts data from multiQC json file, or loads data extracted by an earlier run (see VV.multiqc_cache)
+        cache = multiqc_cache()
+        cache_key = cache.key(multiQC_json, file_mapping, plot_keys) if cache else None
+        cached = cache.load(cache_key) if cache else None
+        if cached is not None:
+            self.data = self._from_arrays(cached)
+        else:
+            self.data = self._extract_multiQC_data(json_file = multiQC_json, samples = self.samples)
+            if cache:
+                cache.store(cache_key, self._to_arrays())
         self.sample_wise_data_keys = list(self.data[self.samples[0]].keys())
 
         # holds subsets computed by user
@@ -70,6 +347,9 @@ class MultiQC():
         # removed as this check is sample-wise
         # assert key in self.sample_wise_data_keys, f"Missing key {key}"
 
+        if key in self.plot_matrices:
+            return self._compile_indexed_subset(samples_subset, key, aggregator)
+
         for sample in samples_subset:
             # handle cases where not every sample is plotted
             # this occurs for instance when only a limited number of samples
@@ -114,10 +394,49 @@ class MultiQC():
 
         return compiled
 
+    def _plotted_samples(self, samples_subset: list, key: str) -> list:
+        plot = self.plot_matrices[key]
+        plotted = list()
+        for sample in samples_subset:
+            # handle cases where not every sample is plotted
+            # this occurs for instance when only a limited number of samples
+            # have adapter content, while are adapter-free and unplotted
+            if sample not in plot.sample_index:
+                print(f"No data for {sample} for {key}")
+                continue # skip this sample, unplotted and data does not exist
+            plotted.append(sample)
+        return plotted
+
+    def _compile_indexed_subset(self, samples_subset: list, key: str, aggregator: Callable = None):
+        """ compile_subset for XY line graph data, read from the plot matrix
+
+        Returns {bin: [value for each plotted sample with the bin]}, or with an aggregator,
+        the aggregate of each sample's values (ordered by bin)
+        """
+        plot = self.plot_matrices[key]
+        samples = self._plotted_samples(samples_subset, key)
+        if not samples:
+            return [] if aggregator else None
+        rows = [plot.sample_index[sample] for sample in samples]
+        columns = plot.subset_columns(samples)
+        matrix = plot.matrix[np.ix_(rows, columns)]
+        present = plot.present[np.ix_(rows, columns)]
+
+        # if aggregator supplied, aggregate across bins by using the function
+        if aggregator:
+            if present.all():
+                return [aggregator(values) for values in matrix.tolist()]
+            # samples with differing bins, the i-th values plotted for each bin are aggregated
+            compiled_values = [matrix[present[:, i], i].tolist() for i in range(len(columns))]
+            return [aggregator(list(values)) for values in zip(*compiled_values)]
+        return {plot.bins[column]: matrix[present[:, i], i].tolist() for i, column in enumerate(columns)}
+
     def detect_outliers(self, key: str, deviation: float, subset_samples: list = None):
         # if subset samples not given, assume all samples for outlier detection
         if not subset_samples:
             subset_samples = self.samples
+        if key in self.plot_matrices:
+            return self._detect_indexed_outliers(key, deviation, subset_samples)
         values = self.compile_subset(subset_samples, key)
         outliers = list()
         # handle one value per sample style data
@@ -131,25 +450,6 @@ class MultiQC():
                 stdevs_from_median = abs(value - _median) / _stdev
                 if stdevs_from_median > deviation:
                     outliers.append((subset_samples[i], stdevs_from_median))
-
-        elif type(values) == dict:
-            for index, values in values.items():
-                # line graphs that did not start at the origin
-                # (values of zero before a certain x value - e.g. length distribution plot)
-                # these do not have entries and must be corrected with explicit zeros
-                # add zeroes to length of subset_samples
-                implicit_zeroes = len(subset_samples) - len(values)
-                if implicit_zeroes:
-                    values.extend([0]*implicit_zeroes)
-                _stdev = stdev(values)
-                _median = median(values)
-                if _stdev == 0:
-                    #print(f"Standard Deviation equals zero for {key}:{index}. No outliers values.")
-                    continue
-                for i, value in enumerate(values):
-                    stdevs_from_median = abs(value - _median) / _stdev
-                    if stdevs_from_median > deviation:
-                        outliers.append((subset_samples[i], index, stdevs_from_median))
         else:
             print(type(values))
             raise ValueError("Unknown type for outlier detection")
@@ -161,21 +461,42 @@ class MultiQC():
             pass
         return outliers
 
+    def _detect_indexed_outliers(self, key: str, deviation: float, subset_samples: list):
+        """ detect_outliers for XY line graph data, by bin from the plot matrix
+
+        Returns (sample, bin, stdevs_from_median) ordered by bin then sample
+        """
+        deviations = self.bin_deviations(key, subset_samples)
+        stdevs_from_median = deviations.stdevs_from_median
+        return [(deviations.samples[row], deviations.bins[i], float(stdevs_from_median[row, i]))
+                for i, row in zip(*np.nonzero((stdevs_from_median > deviation).T))]
+
+    def bin_deviations(self, key: str, subset_samples: list = None) -> BinDeviations:
+        """ Standard deviations from the median of each bin for XY line graph data
+
+        Computed once per key and subset, outliers at any deviation are then masks over the result
+        """
+        # if subset samples not given, assume all samples for outlier detection
+        if not subset_samples:
+            subset_samples = self.samples
+        cache_key = (key, tuple(subset_samples))
+        deviations = self._bin_deviations.get(cache_key)
+        if deviations is None:
+            deviations = self._bin_deviations[cache_key] = BinDeviations(self.plot_matrices[key],
+                                                                         self._plotted_samples(subset_samples, key),
+                                                                         list(subset_samples))
+        return deviations
+
     def _sample_filelabel_from_filename(self, query_filename: str):
         """ Given a filename.  Return the file label and sample based on file_mapping.
         """
-        matched = False
-        for sample, file_map in self.file_mapping.items():
-            for filelabel, search_file in file_map.items():
-                # search_file: # has extension and parent paths, these are removed when comparing
-                # query_filename: sample1_R1 # notice no extension
-                if query_filename in str(search_file):
-                    if not matched:
-                        matched = (sample, filelabel)
-                    else:
-                        raise ValueError(f"File name {query_filename} matched multiple filenames in provided mapping {self.file_mapping}")
+        # search_file: # has extension and parent paths, these are removed when comparing
+        # query_filename: sample1_R1 # notice no extension
+        matched = self._filename_index.matches(query_filename)
+        if len(matched) > 1:
+            raise ValueError(f"File name {query_filename} matched multiple filenames in provided mapping {self.file_mapping}")
         if matched:
-            return matched
+            return matched[0]
         else:
         # no matches
             raise ValueError(f"File name {query_filename} did not match any in provided mapping {self.file_mapping}")
@@ -184,8 +505,8 @@ class MultiQC():
     # TODO: These should return a value that will be assigned directly to the data mapping
     def _extract_multiQC_data(self, json_file: Path, samples):
         data_mapping = defaultdict(lambda: defaultdict(dict))
-        with open(json_file, "r") as f:
-            raw_data = json.load(f)
+        with span("multiqc json load", "io", path = json_file), open(json_file, "r") as f:
+            raw_data = json.load(f) if self.plot_keys is None else self._load_selected(f)
 
         ###  extract general stats
         for file_data in raw_data["report_general_stats_data"]:
@@ -222,6 +543,81 @@ class MultiQC():
             data_mapping[sample] = dict(data_mapping[sample])
         return data_mapping
 
+    def _to_arrays(self) -> dict:
+        """ data and plot_matrices as arrays for caching
+
+        Plot matrices are stored as arrays, other data (i.e. single values, keys and units) as json
+        """
+        arrays = dict()
+        plots = list()
+        for i, (data_key, plot) in enumerate(self.plot_matrices.items()):
+            samples = list(plot.sample_index)
+            plots.append([data_key, samples, plot.bins])
+            arrays[f"matrix_{i}"] = plot.matrix
+            arrays[f"columns_{i}"] = np.concatenate([plot.columns[sample] for sample in samples])
+            arrays[f"column_counts_{i}"] = np.array([len(plot.columns[sample]) for sample in samples], dtype=np.intp)
+        data = list()
+        for sample, sample_data in self.data.items():
+            entries = list()
+            for key, data_entry in sample_data.items():
+                if isinstance(data_entry, OneValueData):
+                    entries.append(["value", key, data_entry.units, data_entry.value])
+                else:
+                    # bins are stored only if not the bins plotted for the sample
+                    bins = data_entry.bins if data_entry.bins != data_entry.plot.sample_bins[sample] else None
+                    entries.append(["indexed", key, data_entry.units, data_entry.bin_units, bins])
+            data.append([sample, entries])
+        arrays["data"] = np.array(json.dumps({"plots": plots, "data": data}))
+        return arrays
+
+    def _from_arrays(self, arrays: dict) -> dict:
+        """ Restores plot_matrices and returns data from _to_arrays output """
+        stored = json.loads(arrays["data"].item())
+        for i, (data_key, samples, bins) in enumerate(stored["plots"]):
+            matrix = arrays[f"matrix_{i}"]
+            sample_columns = np.split(arrays[f"columns_{i}"], np.cumsum(arrays[f"column_counts_{i}"])[:-1])
+            self.plot_matrices[data_key] = PlotMatrix({sample: ([bins[column] for column in columns.tolist()],
+                                                                matrix[row, columns])
+                                                       for row, (sample, columns) in enumerate(zip(samples, sample_columns))})
+        data_mapping = dict()
+        for sample, entries in stored["data"]:
+            data_mapping[sample] = dict()
+            for entry_type, key, units, *fields in entries:
+                if entry_type == "value":
+                    data_mapping[sample][key] = OneValueData(datakey = key, units = units, value = fields[0])
+                else:
+                    bin_units, bins = fields
+                    plot = self.plot_matrices[key]
+                    data_mapping[sample][key] = \
+                        IndexedValuesData( datakey = key,
+                                           units = units,
+                                           bins = bins if bins is not None else plot.sample_bins[sample],
+                                           bin_units = bin_units,
+                                           plot = plot,
+                                           sample = sample)
+        return data_mapping
+
+    def _plot_selected(self, plot_name: str) -> bool:
+        """ Whether a plot is referenced by plot_keys, either directly or with a data label (e.g. '-Percentages') """
+        return any(key == plot_name or key.startswith(f"{plot_name}-") for key in self.plot_keys)
+
+    def _load_selected(self, f) -> dict:
+        """ Reads general stats and the plots selected by plot_keys from the json, other values are skipped """
+        stream = _JsonStream(f)
+        raw_data = {"report_plot_data": dict()}
+        for key in stream.members():
+            if key == "report_general_stats_data":
+                raw_data[key] = stream.value()
+            elif key == "report_plot_data":
+                for plot_name in stream.members():
+                    if self._plot_selected(plot_name):
+                        raw_data[key][plot_name] = stream.value()
+                    else:
+                        stream.skip()
+            else:
+                stream.skip()
+        return raw_data
+
     """
     def _extract_from_heatmap(self, data, plot_name, data_mapping, samples):
         # determine data mapping for samples in multiqc (which are files)
@@ -259,11 +655,12 @@ class MultiQC():
         # this should be a list with one entry
         assert len(data["samples"]) == 1
         for i, mqc_sample in enumerate(data["samples"][0]):
-            matching_samples = [sample for sample in samples if sample in mqc_sample]
+            # the same multiQC samples are listed for every bar graph
+            if mqc_sample not in self._bar_graph_sample_matches:
+                self._bar_graph_sample_matches[mqc_sample] = sum(sample in mqc_sample for sample in samples)
             # only one sample should map
-            assert len(matching_samples) == 1
+            assert self._bar_graph_sample_matches[mqc_sample] == 1
 
-            sample = matching_samples[0]
             mqc_samples_to_samples[i] = (self._sample_filelabel_from_filename(mqc_sample))
 
         # iterate through data from datasets
@@ -299,6 +696,8 @@ class MultiQC():
             isCategorical = False
 
 
+        # data key to sample to (bins, values), matrices are built once all lines are read
+        plotted = defaultdict(dict)
         # dataset represents an entire plot (i.e. all lines)
         # Note: for xy plots with both percent and raw counts, there will be two datasets
         for i, dataset in enumerate(data["datasets"]):
@@ -327,15 +726,20 @@ class MultiQC():
                 # three level nested dict entries for xy graphs
                 # {sample: {sample_file-plot_type: {index: value}}}
                 data_key = f"{sample_file}-{plot_name}{data_label}"
+                # for non-categorical bins, each values should be an [index,value]
+                values = [(j, float(value)) for j, value in values]
+                plotted[data_key][sample] = ([j for j, _ in values], [value for _, value in values], these_bins)
+                data_mapping[sample][data_key] = None # data is populated once the plot matrix is built
+
+        for data_key, sample_lines in plotted.items():
+            plot = PlotMatrix({sample: (bins, values) for sample, (bins, values, _) in sample_lines.items()})
+            self.plot_matrices[data_key] = plot
+            for sample, (_, _, these_bins) in sample_lines.items():
                 data_mapping[sample][data_key] = \
                     IndexedValuesData( datakey = data_key,
                                        units = data["config"]["ylab"],
                                        bins = these_bins,
                                        bin_units = data["config"]["xlab"],
-                                       values = dict()) # data is populated later
-                cur_data_mapping_entry = data_mapping[sample][data_key]
-
-                # for non-categorical bins, each values should be an [index,value]
-                for j, value in values:
-                    cur_data_mapping_entry.values[j] = float(value)
+                                       plot = plot,
+                                       sample = sample)
         return data_mapping
@@ -0,0 +1,111 @@
+""" On-disk cache of data parsed from multiQC json files
+
+Opt-in: once a cache directory is set with use_multiqc_cache, each MultiQC
+object stores its parsed data (see MultiQC._to_arrays) as an npz file in the
+directory and later MultiQC objects for the same json load it instead of
+parsing the json.  Entries are keyed by the json's resolved path, size,
+modification time and content hash, along with the file mapping and plot keys
+used to parse it.
+
+The directory is kept under a size limit by removing the least recently used
+entries (by modification time, which is updated when an entry is loaded).
+Entries that cannot be loaded are removed and the json is parsed.
+"""
+import os
+import json
+import hashlib
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 1 << 30 # 1 GiB
+
+# changed when the stored arrays change, entries from other versions are not used
+CACHE_VERSION = 1
+
+CACHE_SUFFIX = ".npz"
+
+def _content_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class MultiQCCache():
+    """ Parsed multiQC data by json fingerprint, in npz files in cache_dir """
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents = True, exist_ok = True)
+
+    def key(self, json_file: Path, file_mapping: dict, plot_keys: list) -> str:
+        """ Cache key for a json file as parsed with the file mapping and plot keys """
+        json_file = Path(json_file).resolve()
+        stat = json_file.stat()
+        fingerprint = [CACHE_VERSION,
+                       str(json_file),
+                       stat.st_size,
+                       stat.st_mtime_ns,
+                       _content_hash(json_file),
+                       [[sample, [[filelabel, str(file)] for filelabel, file in file_map.items()]]
+                        for sample, file_map in file_mapping.items()],
+                       plot_keys]
+        return hashlib.sha256(json.dumps(fingerprint).encode()).hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{CACHE_SUFFIX}"
+
+    def load(self, key: str) -> dict:
+        """ Arrays stored for key, None if not cached """
+        entry = self._entry(key)
+        try:
+            with np.load(entry, allow_pickle = False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zipfile.BadZipFile):
+            print(f"Warning: removing unreadable multiQC cache entry {entry}")
+            entry.unlink(missing_ok = True)
+            return None
+        # marks the entry as recently used
+        os.utime(entry)
+        return arrays
+
+    def store(self, key: str, arrays: dict):
+        """ Stores arrays for key, then removes least recently used entries over max_bytes """
+        entry = self._entry(key)
+        # written under a temporary name so a partly written entry is never loaded
+        partial = entry.with_name(f"{entry.name}.{os.getpid()}.partial")
+        with open(partial, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(partial, entry)
+        self.evict()
+
+    def evict(self):
+        """ Removes least recently used entries until the cache is within max_bytes """
+        entries = list()
+        for entry in self.cache_dir.glob(f"*{CACHE_SUFFIX}"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError: # removed by another process
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key = lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok = True)
+            total -= size
+
+_cache = None
+
+def use_multiqc_cache(cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+    """ Caches data parsed by MultiQC objects in cache_dir, None to stop caching """
+    global _cache
+    _cache = MultiQCCache(cache_dir, max_bytes) if cache_dir is not None else None
+
+def multiqc_cache() -> MultiQCCache:
+    """ The cache set with use_multiqc_cache, None if not caching """
+    return _cache
@@ -12,6 +12,23 @@ from VV.utils import filevalues_from_mapping, value_based_checks, check_fastq_he
 from VV.flagging import Flagger
 from VV import multiqc
 
+# checks based on the multiQC json, check_id and general_mqc_based_check arguments
+MQC_CHECK_SPECIFIC_ARGS = [
+    ("R_1002", {"mqc_base_key":"fastqc_sequence_length_distribution_plot", "by_indice":True, "allow_missing_base_key":True}),
+    ("R_1003", {"mqc_base_key":"percent_duplicates"}),
+    ("R_1004", {"mqc_base_key":"percent_gc"}),
+    ("R_1005", {"mqc_base_key":"fastqc_per_base_sequence_quality_plot", "by_indice":True}),
+    ("R_1006", {"mqc_base_key":"fastqc_per_sequence_quality_scores_plot", "by_indice":True}),
+    ("R_1007", {"mqc_base_key":"fastqc_per_sequence_gc_content_plot-Percentages", "by_indice":True}),
+    ("R_1008", {"mqc_base_key":"fastqc_sequence_duplication_levels_plot", "by_indice":True}),
+    ("R_1009", {"mqc_base_key":"fastqc_per_base_n_content_plot", "aggregation_function":sum, "cutoffs_subkey":"bin_sum"}),
+    ("R_1010", {"mqc_base_key":"fastqc_per_base_n_content_plot", "aggregation_function":statistics.mean, "cutoffs_subkey":"bin_mean"}),
+    ("R_1011", {"mqc_base_key":"fastqc_overrepresented_sequences_plot-Top over-represented sequence"}),
+    ("R_1012", {"mqc_base_key":"fastqc_overrepresented_sequences_plot-Sum of remaining over-represented sequences"}),
+]
+# plots used by the checks, other plots are not read from the multiQC json
+MQC_PLOT_KEYS = [mqc_check_args["mqc_base_key"] for _, mqc_check_args in MQC_CHECK_SPECIFIC_ARGS]
+
 def validate_verify(file_mapping: dict,
                     cutoffs: dict,
                     flagger: Flagger,
@@ -45,6 +62,7 @@ def validate_verify(file_mapping: dict,
             flagger.flag_file_exists(check_file = file,
                                      partial_check_args = checkArgs)
     # R_0002 ##########################################################
+    flagger.begin_check("R_0002")
     num_lines_to_check = cutoffs[cutoffs_subsection]["fastq_lines_to_check"]
     for sample in file_mapping.keys():
         checkArgs = dict()
@@ -67,6 +85,7 @@ def validate_verify(file_mapping: dict,
     # R_0003 ##########################################################
     partial_check_args = dict()
     partial_check_args["check_id"] = "R_0003"
+    flagger.begin_check(partial_check_args["check_id"])
     def file_size(file: Path):
         """ Returns filesize for a Path object
         """
@@ -107,7 +126,8 @@ def validate_verify_multiqc(multiqc_json: Path,
     ##############################################################
     mqc = multiqc.MultiQC(multiQC_json = multiqc_json,
                           file_mapping = file_mapping,
-                          outlier_comparision_point = outlier_comparision_point)
+                          outlier_comparision_point = outlier_comparision_point,
+                          plot_keys = MQC_PLOT_KEYS)
     samples = list(file_mapping.keys())
     ### UNIQUE IMPLEMENTATION CHECKS ##################################
     # R_1001 ##########################################################
@@ -131,20 +151,7 @@ def validate_verify_multiqc(multiqc_json: Path,
             flagger.flag(**check_args)
 
     ################################################################
-    check_specific_args = [
-        ("R_1002", {"mqc_base_key":"fastqc_sequence_length_distribution_plot", "by_indice":True, "allow_missing_base_key":True}),
-        ("R_1003", {"mqc_base_key":"percent_duplicates"}),
-        ("R_1004", {"mqc_base_key":"percent_gc"}),
-        ("R_1005", {"mqc_base_key":"fastqc_per_base_sequence_quality_plot", "by_indice":True}),
-        ("R_1006", {"mqc_base_key":"fastqc_per_sequence_quality_scores_plot", "by_indice":True}),
-        ("R_1007", {"mqc_base_key":"fastqc_per_sequence_gc_content_plot-Percentages", "by_indice":True}),
-        ("R_1008", {"mqc_base_key":"fastqc_sequence_duplication_levels_plot", "by_indice":True}),
-        ("R_1009", {"mqc_base_key":"fastqc_per_base_n_content_plot", "aggregation_function":sum, "cutoffs_subkey":"bin_sum"}),
-        ("R_1010", {"mqc_base_key":"fastqc_per_base_n_content_plot", "aggregation_function":statistics.mean, "cutoffs_subkey":"bin_mean"}),
-        ("R_1011", {"mqc_base_key":"fastqc_overrepresented_sequences_plot-Top over-represented sequence"}),
-        ("R_1012", {"mqc_base_key":"fastqc_overrepresented_sequences_plot-Sum of remaining over-represented sequences"}),
-        ]
-    for check_id, mqc_check_args in check_specific_args:
+    for check_id, mqc_check_args in MQC_CHECK_SPECIFIC_ARGS:
         print(f"Running {check_id}")
         check_args = dict()
         check_args["check_id"] = check_id
@@ -9,6 +9,7 @@ import pandas as pd
 
 from VV.utils import value_check_direct
 from VV.flagging import Flagger
+from VV.tracing import span
 
 class RsemCounts():
     """ Representation of Rsem results for a set of samples.
@@ -68,8 +69,10 @@ class RsemCounts():
                                           partial_check_args = partial_check_args)
 
 
-            self.gene_counts[sample] = pd.read_csv(gene_count_path ,sep="\t")
-            self.isoform_counts[sample] = pd.read_csv(isoform_count_path ,sep="\t")
+            with span("read_csv", "io", path = gene_count_path):
+                self.gene_counts[sample] = pd.read_csv(gene_count_path ,sep="\t")
+            with span("read_csv", "io", path = isoform_count_path):
+                self.isoform_counts[sample] = pd.read_csv(isoform_count_path ,sep="\t")
 
         # vv related to genes
         counts_of_NonERCC_genes_expressed = dict()
@@ -104,36 +107,32 @@ class RsemCounts():
             counts_of_isoforms_expressed[sample] = len(df.loc[isExpressed])
 
         # flag if under average count
-        partial_check_args = {"check_id":"M_0003"}
         file_path = self.file_mapping[sample][".genes.results"]
-        partial_check_args["full_path"] = Path(file_path).resolve()
-        partial_check_args["filename"] = Path(file_path).name
         mean_count = statistics.mean(counts_of_NonERCC_genes_expressed.values())
-        for sample, count in counts_of_NonERCC_genes_expressed.items():
-            partial_check_args["entity"] = sample
-            if count < mean_count:
-                partial_check_args["debug_message"] = "Gene counts are less than the average."
-                partial_check_args["severity"] = 50
-            else:
-                partial_check_args["debug_message"] = "Gene counts are not less than the average"
-                partial_check_args["severity"] = 30
-            self.flagger.flag(**partial_check_args)
+        below_mean = pd.Series(counts_of_NonERCC_genes_expressed) < mean_count
+        self.flagger.flag_many(check_id = "M_0003",
+                               results = pd.DataFrame({
+                                   "entity": below_mean.index,
+                                   "debug_message": below_mean.map({True: "Gene counts are less than the average.",
+                                                                    False: "Gene counts are not less than the average"}),
+                                   "severity": below_mean.map({True: 50, False: 30}),
+                                   }),
+                               full_path = Path(file_path).resolve(),
+                               filename = Path(file_path).name)
 
         # flag if under average count
-        partial_check_args = {"check_id":"M_0004"}
         file_path = self.file_mapping[sample][".isoforms.results"]
-        partial_check_args["full_path"] = Path(file_path).resolve()
-        partial_check_args["filename"] = Path(file_path).name
         mean_count = statistics.mean(counts_of_NonERCC_isoforms_expressed.values())
-        for sample, count in counts_of_NonERCC_isoforms_expressed.items():
-            partial_check_args["entity"] = sample
-            if count < mean_count:
-                partial_check_args["debug_message"] = "Isoform counts are less than the average."
-                partial_check_args["severity"] = 50
-            else:
-                partial_check_args["debug_message"] = "Isoform counts are not less than the average"
-                partial_check_args["severity"] = 30
-            self.flagger.flag(**partial_check_args)
+        below_mean = pd.Series(counts_of_NonERCC_isoforms_expressed) < mean_count
+        self.flagger.flag_many(check_id = "M_0004",
+                               results = pd.DataFrame({
+                                   "entity": below_mean.index,
+                                   "debug_message": below_mean.map({True: "Isoform counts are less than the average.",
+                                                                    False: "Isoform counts are not less than the average"}),
+                                   "severity": below_mean.map({True: 50, False: 30}),
+                                   }),
+                               full_path = Path(file_path).resolve(),
+                               filename = Path(file_path).name)
 
 
         ################################################################
@@ -10,6 +10,15 @@ from VV.utils import value_check_direct
 from VV.flagging import Flagger
 from VV import multiqc
 
+# checks based on the multiQC json, check_id and general_mqc_based_check arguments
+MQC_CHECK_SPECIFIC_ARGS = [
+    ("RS_1001", {"mqc_base_key":"rseqc_infer_experiment_plot-Sense"}),
+    ("RS_1002", {"mqc_base_key":"rseqc_infer_experiment_plot-Antisense"}),
+    ("RS_1003", {"mqc_base_key":"rseqc_infer_experiment_plot-Undetermined"}),
+]
+# plots used by the checks, other plots are not read from the multiQC json
+MQC_PLOT_KEYS = [mqc_check_args["mqc_base_key"] for _, mqc_check_args in MQC_CHECK_SPECIFIC_ARGS]
+
 class Rseqc():
     """ Representation of RSeQC output results data.
     """
@@ -34,16 +43,11 @@ class Rseqc():
                 
         mqc = multiqc.MultiQC(multiQC_json = multiqc_json,
                               file_mapping = file_mapping,
-                              outlier_comparision_point = outlier_comparision_point)
-
+                              outlier_comparision_point = outlier_comparision_point,
+                              plot_keys = MQC_PLOT_KEYS)
 
-        check_specific_args = [
-            ("RS_1001", {"mqc_base_key":"rseqc_infer_experiment_plot-Sense"}),
-            ("RS_1002", {"mqc_base_key":"rseqc_infer_experiment_plot-Antisense"}),
-            ("RS_1003", {"mqc_base_key":"rseqc_infer_experiment_plot-Undetermined"}),
-            ]
 
-        for check_id, mqc_check_args in check_specific_args:
+        for check_id, mqc_check_args in MQC_CHECK_SPECIFIC_ARGS:
             check_args = {"convert_sub_entity":False}
             check_args["check_id"] = check_id
             check_args["full_path"] = Path(multiqc_json).resolve()
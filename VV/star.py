@@ -6,6 +6,7 @@ from pathlib import Path
 
 from VV.utils import value_check_direct
 from VV.flagging import Flagger
+from VV.tracing import span
 
 class StarAlignments():
     """ Representation of Star Alignment output results data.
@@ -135,7 +136,7 @@ class StarAlignments():
                                           partial_check_args = partial_check_args)
 
             # extract data from file
-            with file_path.open() as f:
+            with span("read STAR log", "io", path = file_path), file_path.open() as f:
                 for line in f.readlines():
                     # Data lines contain '|''
                     if "|" in line:
@@ -199,7 +200,7 @@ class StarAlignments():
 
             # Check file looks corret
             partial_check_args["debug_message"] = ""
-            with check_file.open() as f:
+            with span("read STAR log", "io", path = check_file), check_file.open() as f:
                 lines = f.readlines()
             if not lines[0].strip().startswith(EXPECTED_FIRSTLINE_START_SUBSTRING):
                 partial_check_args["debug_message"] += (f"First line does not "
@@ -227,7 +228,7 @@ class StarAlignments():
                                           partial_check_args = partial_check_args)
             # check file contents
             partial_check_args["debug_message"] = ""
-            with sj_out_file.open() as f:
+            with span("read STAR log", "io", path = sj_out_file), sj_out_file.open() as f:
                 for i, line in enumerate(f.readlines()):
                     if i % 100 == 0:
                         tokens = line.split()
@@ -254,7 +255,7 @@ class StarAlignments():
                                           partial_check_args = partial_check_args)
             # check file contents
             partial_check_args["debug_message"] = ""
-            with log_progress_out_file.open() as f:
+            with span("read STAR log", "io", path = log_progress_out_file), log_progress_out_file.open() as f:
                 lines = f.readlines()
             partial_check_args["full_path"] = Path(log_progress_out_file).resolve()
             partial_check_args["filename"] = Path(log_progress_out_file).name
@@ -295,10 +296,11 @@ class StarAlignments():
                                           partial_check_args = partial_check_args)
 
             # check with coord file with samtools
-            process = subprocess.Popen(['samtools', 'quickcheck', coord_file],
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
-            stdout, stderr = process.communicate()
+            with span("samtools quickcheck", "io", path = coord_file):
+                process = subprocess.Popen(['samtools', 'quickcheck', coord_file],
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+                stdout, stderr = process.communicate()
             if stdout:
                 partial_check_args["debug_message"] += (f"samtools quickcheck {coord_file}: {stdout}")
                 samtools_flag = True
@@ -309,10 +311,11 @@ class StarAlignments():
                                           partial_check_args = partial_check_args)
 
             # check with coord file with samtools
-            process = subprocess.Popen(['samtools', 'quickcheck', transcript_file],
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
-            stdout, stderr = process.communicate()
+            with span("samtools quickcheck", "io", path = transcript_file):
+                process = subprocess.Popen(['samtools', 'quickcheck', transcript_file],
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+                stdout, stderr = process.communicate()
             if stdout:
                 partial_check_args["debug_message"] += (f"samtools quickcheck {transcript_file}: {stdout}")
                 samtools_flag = True
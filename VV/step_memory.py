@@ -0,0 +1,101 @@
+""" Per step peak memory and allocation sites
+
+Opt-in (tracemalloc slows allocation heavy code).  For each step the profiler records:
+  - peak RSS: VmHWM from /proc/self/status, reset at the start of each step by
+    writing to /proc/self/clear_refs.  Where that is not possible the process
+    peak so far (ru_maxrss) is reported, with peak_rss_scope 'process'
+  - the traced (Python allocation) peak during the step
+  - the top allocation sites by growth in traced memory from the start to the end of the step
+"""
+import csv
+import sys
+import tracemalloc
+from pathlib import Path
+
+from VV.compression import open_log
+
+STEP_MEMORY_HEADER = ["step", "peak_rss_bytes", "peak_rss_scope", "traced_peak_bytes", "top_allocation_sites"]
+
+DEFAULT_TOP_SITES = 5
+
+# allocations by tracemalloc and the import system are not of interest
+_IGNORED_TRACES = [tracemalloc.Filter(False, tracemalloc.__file__),
+                   tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                   tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                   tracemalloc.Filter(False, "<unknown>")]
+
+def _reset_peak_rss() -> bool:
+    """ Resets VmHWM to the current RSS, False if not possible """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def _peak_rss(step_scoped: bool) -> int:
+    """ Peak RSS in bytes, since the last reset if step_scoped else for the process """
+    if step_scoped:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    import resource
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+class StepMemoryProfiler():
+    """ Peak RSS and top allocation sites for each step, a step is measured from begin until end """
+    def __init__(self, top_sites: int = DEFAULT_TOP_SITES):
+        self.top_sites = top_sites
+        self.rows = list()
+        # (step, whether the rss peak was reset, tracemalloc snapshot) for the step being measured
+        self._current = None
+        self._started_tracing = False
+
+    @property
+    def current(self) -> str:
+        """ step being measured, None between steps """
+        return self._current[0] if self._current else None
+
+    def begin(self, step: str):
+        """ Starts measuring a step, ending the current one """
+        self.end()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if hasattr(tracemalloc, "reset_peak"): # python 3.9+
+            tracemalloc.reset_peak()
+        self._current = (step, _reset_peak_rss(), tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES))
+
+    def end(self):
+        """ Stops measuring the current step, adding its row """
+        if self._current is None:
+            return
+        step, step_scoped, start_snapshot = self._current
+        self._current = None
+        _, traced_peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+        growth = [stat for stat in snapshot.compare_to(start_snapshot, "lineno") if stat.size_diff > 0]
+        sites = [f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} {stat.size_diff:+d}"
+                 for stat in growth[:self.top_sites]]
+        self.rows.append([step, _peak_rss(step_scoped), "step" if step_scoped else "process",
+                          traced_peak, "; ".join(sites) if sites else "NA"])
+
+    def stop(self):
+        """ Ends the current step and stops tracing if started here """
+        self.end()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def write(self, output: Path):
+        """ Appends measured steps to output, with a header if new """
+        write_header = not output.is_file()
+        with open_log(output, "a") as f:
+            writer = csv.writer(f, delimiter = "\t", lineterminator = "\n")
+            if write_header:
+                writer.writerow(STEP_MEMORY_HEADER)
+            writer.writerows(self.rows)
+        self.rows = list()
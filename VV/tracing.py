@@ -0,0 +1,120 @@
+""" Chrome trace event output for a V-V run
+
+Opt-in: once tracing is started, spans for steps, checks and file I/O are
+recorded as complete ('X') events with the process and thread id, and written
+as Chrome trace event JSON, which opens in chrome://tracing or Perfetto
+(ui.perfetto.dev).  When tracing is not started (the default) spans are not
+recorded.
+
+with span("read_csv", "io", path = file):
+    df = pd.read_csv(file)
+
+Tracing is process wide and continues until stop_trace.  Each start_trace
+begins a new trace, discarding events recorded so far, so a trace holds the
+events since the last start (e.g. of one Flagger).  Spans in worker processes
+(e.g. run_forked with a ProcessPoolExecutor) are not recorded.
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+class Tracer():
+    """ Collects trace events, recording only once started """
+    def __init__(self):
+        self.events = list()
+        self.tracing = False
+        self._origin = 0.0
+        self._thread_names = dict()
+        self._lock = threading.Lock()
+        # incremented by each start, identifies the current trace
+        self.trace_id = 0
+
+    def start(self) -> int:
+        """ Starts a new trace, discarding events so far, returns its id """
+        with self._lock:
+            self.events = list()
+            self._thread_names = dict()
+            self.trace_id += 1
+        self._origin = time.perf_counter()
+        self.tracing = True
+        return self.trace_id
+
+    def begin(self, name: str, category: str, **args):
+        """ Starts a span, returns None if not tracing """
+        if not self.tracing:
+            return None
+        return (name, category, args, time.perf_counter(), threading.get_ident())
+
+    def end(self, span):
+        """ Ends a span started with begin, adding its event """
+        if span is None or not self.tracing:
+            return
+        name, category, args, start, thread_id = span
+        end = time.perf_counter()
+        event = {"name": name,
+                 "cat": category,
+                 "ph": "X",
+                 "ts": (start - self._origin) * 1e6,
+                 "dur": (end - start) * 1e6,
+                 "pid": os.getpid(),
+                 "tid": thread_id,
+                 "args": {key: str(value) for key, value in args.items()}}
+        with self._lock:
+            self.events.append(event)
+            if thread_id not in self._thread_names:
+                self._thread_names[thread_id] = threading.current_thread().name
+
+    def write(self, output: Path):
+        """ Writes events so far as Chrome trace event JSON, replacing output """
+        with self._lock:
+            metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread_id,
+                         "args": {"name": thread_name}}
+                        for thread_id, thread_name in self._thread_names.items()]
+            events = metadata + self.events
+        with open(output, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def stop(self):
+        self.tracing = False
+        self.events = list()
+        self._thread_names = dict()
+
+_tracer = Tracer()
+
+def start_trace() -> int:
+    """ Starts recording spans in a new trace, returns the trace's id """
+    return _tracer.start()
+
+def stop_trace():
+    """ Stops recording spans and discards recorded events """
+    _tracer.stop()
+
+def write_trace(output: Path):
+    """ Writes spans recorded so far to output """
+    _tracer.write(output)
+
+def is_tracing() -> bool:
+    return _tracer.tracing
+
+def current_trace() -> int:
+    """ Id of the trace being recorded, None if not tracing """
+    return _tracer.trace_id if _tracer.tracing else None
+
+def begin_span(name: str, category: str, **args):
+    """ Starts a span, for spans that do not fit a with block (e.g. a step ending at the next set_step) """
+    return _tracer.begin(name, category, **args)
+
+def end_span(span):
+    _tracer.end(span)
+
+@contextmanager
+def span(name: str, category: str, **args):
+    """ Records the enclosed block as a span, args are shown with the event """
+    started = _tracer.begin(name, category, **args)
+    try:
+        yield
+    finally:
+        _tracer.end(started)
@@ -11,6 +11,8 @@ from pathlib import Path
 import gzip
 
 from VV.flagging import Flagger
+from VV.tracing import span
+from VV.flag_messages import FlagMessage
 from VV.multiqc import MultiQC
 
 FLAG_LEVELS = {
@@ -162,20 +164,21 @@ def value_based_checks(partial_check_args: dict,
                        middlepoint: str):
     """ Performs checks and sends appropriate flag calls for a value.
     """
-    for sample in value_mapping.keys():
-        partial_check_args["entity"] = sample
-        for filename, (filelabel, value) in value_mapping[sample].items():
-            partial_check_args["sub_entity"] = filelabel
-            partial_check_args["full_path"] = Path(filename).resolve()
-            partial_check_args["filename"] = Path(filename).name
-            value_check_direct(value = value,
-                               all_values = all_values,
-                               check_cutoffs = check_cutoffs[value_alias],
-                               flagger = flagger,
-                               partial_check_args = partial_check_args,
-                               value_alias = value_alias,
-                               middlepoint = check_cutoffs["middlepoint"]
-                               )
+    with flagger.measure(partial_check_args["check_id"]):
+        for sample in value_mapping.keys():
+            partial_check_args["entity"] = sample
+            for filename, (filelabel, value) in value_mapping[sample].items():
+                partial_check_args["sub_entity"] = filelabel
+                partial_check_args["full_path"] = Path(filename).resolve()
+                partial_check_args["filename"] = Path(filename).name
+                value_check_direct(value = value,
+                                   all_values = all_values,
+                                   check_cutoffs = check_cutoffs[value_alias],
+                                   flagger = flagger,
+                                   partial_check_args = partial_check_args,
+                                   value_alias = value_alias,
+                                   middlepoint = check_cutoffs["middlepoint"]
+                                   )
 
 def check_fastq_headers(file, count_lines_to_check: int) -> int:
     """ Checks fastq lines for expected header content
@@ -198,7 +201,7 @@ def check_fastq_headers(file, count_lines_to_check: int) -> int:
     debug_message = ""
     # truncated files raise EOFError
     try:
-        with gzip.open(file, "rb") as f:
+        with span("fastq scan", "io", path = file), gzip.open(file, "rb") as f:
             for i, line in enumerate(f):
                 # checks if lines counted equals the limit input
                 if i+1 == count_lines_to_check:
@@ -238,99 +241,97 @@ def general_mqc_based_check(flagger: Flagger,
                             by_indice: bool = False,
                             allow_missing_base_key: bool = False # this can happen in the case of plots like the fastqc adaptor and length dist plot.  Typically a missing key indicates the plot was not needed due to some positive reason. e.g. all sequence lengths were the same
                             ):
-    try:
-        check_cutoffs = cutoffs[mqc_base_key][cutoffs_subkey] if cutoffs_subkey else cutoffs[mqc_base_key]
-    except KeyError:
-        raise ValueError("ERROR: Could not find {mqc_base_key} in cutoffs! Ensure this exists")
-    # iterate through each sample:file_label
-    # test against all values from all file-labels
-    check_args["outlier_comparison_type"] = "Across-All-Samples:By-File_Label"
-    check_args_for_all_samples = check_args.copy()
-    for sample in samples:
-        check_args_this_sample = check_args_for_all_samples.copy()
-        check_args_this_sample["entity"] = sample
-        for file_label in mqc.file_labels:
-            check_args = check_args_this_sample.copy()
-            check_args["sub_entity"] = file_label
-            # used to access the label wise values
-            full_key = f"{file_label}-{mqc_base_key}"
-            # handle allow missing base keys
-            #print(f"Data below for {sample}, {full_key}")
-            #print(mqc.data[sample].get(full_key))
-            if allow_missing_base_key and not mqc.data[sample].get(f"{file_label}-{mqc_base_key}"):
-                # this block indicates a special pass case
-                flagger.flag(**check_args,
-                            severity=30,
-                            debug_message=f"Missing plot under {mqc_base_key}.  This check automatically passes in this case as this means the plot was replaced with a message indicating no issues in multiQC",
-                            user_message=f"No issues for {mqc_base_key}."
-                            )
-                continue # start next sub entity check
-
-            if not by_indice:
-                # note: this is just the sample to check for outliers!
-                value = mqc.compile_subset(samples_subset = [sample], key = full_key, aggregator = aggregation_function)
-                # additional unpacking if aggregator used
-                if isinstance(value,list):
-                    assert len(value) == 1, "Aggregation should return more than one value!"
-                     # an error here may indicate an issue generating a single value from the compile subset arg
-                    value = float(value[0])
-                # this is all values from all samples and the same filelabel
-                all_values = mqc.compile_subset(samples_subset = samples, key = full_key, aggregator = aggregation_function)
-                check_args["entity_value"] = value
-                check_args["entity_value_units"] = f"{cutoffs_subkey}-{mqc_base_key}" if cutoffs_subkey else mqc_base_key
-
-                # all_values may be empty if every sample has no value assigned
-                # catch this before sending it to the value_check_direct call and flag as passing
-                ALLOWED_ALL_VALUES_EMPTY_BASE_KEYS = ["fastqc_overrepresented_sequences_plot-Top over-represented sequence","fastqc_overrepresented_sequences_plot-Sum of remaining over-represented sequences"]
-                if not all_values:
-                    print(f"all_values empty, checking if valid for key {full_key}")
-                    # using mqc_base_key, catch all known conditionally present values, those with potential to be all_values empty
-                    if any([full_key.endswith(base_key) for base_key in ALLOWED_ALL_VALUES_EMPTY_BASE_KEYS]):
-                        # flag as passing
-                        check_args["debug_message"] = f"For key: {full_key}, found no conditional values, this indicates the message '<total number of read files> samples had less than 1% of reads made up of overrepresented sequences MUST BE PRESENT and this check should pass."
-                        check_args["severity"] = 30 # passing
-                        flagger.flag(**check_args)
-
-                    else:
-                        raise ValueError(f"Error in parsing multiQC json, unexpected 'all_values' empty for key: {full_key}")
+    with flagger.measure(check_args["check_id"]):
+        try:
+            check_cutoffs = cutoffs[mqc_base_key][cutoffs_subkey] if cutoffs_subkey else cutoffs[mqc_base_key]
+        except KeyError:
+            raise ValueError("ERROR: Could not find {mqc_base_key} in cutoffs! Ensure this exists")
+        # iterate through each sample:file_label
+        # test against all values from all file-labels
+        check_args["outlier_comparison_type"] = "Across-All-Samples:By-File_Label"
+        check_args_for_all_samples = check_args
+        for sample in samples:
+            for file_label in mqc.file_labels:
+                # single copy per sample:file_label, args set below must not carry over
+                check_args = dict(check_args_for_all_samples, entity = sample, sub_entity = file_label)
+                # used to access the label wise values
+                full_key = f"{file_label}-{mqc_base_key}"
+                # handle allow missing base keys
+                #print(f"Data below for {sample}, {full_key}")
+                #print(mqc.data[sample].get(full_key))
+                if allow_missing_base_key and not mqc.data[sample].get(f"{file_label}-{mqc_base_key}"):
+                    # this block indicates a special pass case
+                    flagger.flag(**check_args,
+                                severity=30,
+                                debug_message=f"Missing plot under {mqc_base_key}.  This check automatically passes in this case as this means the plot was replaced with a message indicating no issues in multiQC",
+                                user_message=f"No issues for {mqc_base_key}."
+                                )
+                    continue # start next sub entity check
+
+                if not by_indice:
+                    # note: this is just the sample to check for outliers!
+                    value = mqc.compile_subset(samples_subset = [sample], key = full_key, aggregator = aggregation_function)
+                    # additional unpacking if aggregator used
+                    if isinstance(value,list):
+                        assert len(value) == 1, "Aggregation should return more than one value!"
+                         # an error here may indicate an issue generating a single value from the compile subset arg
+                        value = float(value[0])
+                    # this is all values from all samples and the same filelabel
+                    all_values = mqc.compile_subset(samples_subset = samples, key = full_key, aggregator = aggregation_function)
+                    check_args["entity_value"] = value
+                    check_args["entity_value_units"] = f"{cutoffs_subkey}-{mqc_base_key}" if cutoffs_subkey else mqc_base_key
+
+                    # all_values may be empty if every sample has no value assigned
+                    # catch this before sending it to the value_check_direct call and flag as passing
+                    ALLOWED_ALL_VALUES_EMPTY_BASE_KEYS = ["fastqc_overrepresented_sequences_plot-Top over-represented sequence","fastqc_overrepresented_sequences_plot-Sum of remaining over-represented sequences"]
+                    if not all_values:
+                        print(f"all_values empty, checking if valid for key {full_key}")
+                        # using mqc_base_key, catch all known conditionally present values, those with potential to be all_values empty
+                        if any([full_key.endswith(base_key) for base_key in ALLOWED_ALL_VALUES_EMPTY_BASE_KEYS]):
+                            # flag as passing
+                            check_args["debug_message"] = f"For key: {full_key}, found no conditional values, this indicates the message '<total number of read files> samples had less than 1% of reads made up of overrepresented sequences MUST BE PRESENT and this check should pass."
+                            check_args["severity"] = 30 # passing
+                            flagger.flag(**check_args)
+
+                        else:
+                            raise ValueError(f"Error in parsing multiQC json, unexpected 'all_values' empty for key: {full_key}")
                         
 
-                else:
-                    value_check_direct(value = value,
-                                       all_values = all_values,
-                                       check_cutoffs = check_cutoffs,
-                                       flagger = flagger,
-                                       partial_check_args = check_args,
-                                       value_alias = mqc_base_key,
-                                       middlepoint = cutoffs["middlepoint"])
-            elif by_indice:
-                flagged = False
-                bin_units = mqc.data[sample][full_key].bin_units
-                check_args["outlier_comparison_type"] = "Across-All-Samples:By-File_Label:By-Bin"
-                # iterate through thresholds in descending order (more severe first)
-                thresholds = sorted(check_cutoffs["outlier_thresholds"], reverse=True)
-                check_args["outlier_thresholds"] = check_cutoffs["outlier_thresholds"]
-                for threshold in thresholds:
-                    outliers = mqc.detect_outliers(key = full_key,
-                                                   deviation = threshold
-                                                  )
-                    check_args["flagged_positions"] = [str(index) for _sample,index,_ in outliers if _sample == sample]
-                    # check if any outliers actually found for this sample
-                    if len(check_args["flagged_positions"]) != 0:
-                        check_args["debug_message"] = f"Outliers detected by {bin_units}"
-                        check_args["severity"] = check_cutoffs["outlier_thresholds"][threshold]
-                        check_args["position_units"] = bin_units
+                    else:
+                        value_check_direct(value = value,
+                                           all_values = all_values,
+                                           check_cutoffs = check_cutoffs,
+                                           flagger = flagger,
+                                           partial_check_args = check_args,
+                                           value_alias = mqc_base_key,
+                                           middlepoint = cutoffs["middlepoint"])
+                elif by_indice:
+                    flagged = False
+                    bin_units = mqc.data[sample][full_key].bin_units
+                    check_args["outlier_comparison_type"] = "Across-All-Samples:By-File_Label:By-Bin"
+                    # iterate through thresholds in descending order (more severe first)
+                    thresholds = sorted(check_cutoffs["outlier_thresholds"], reverse=True)
+                    check_args["outlier_thresholds"] = check_cutoffs["outlier_thresholds"]
+                    # computed once per key, shared by all samples and thresholds
+                    deviations = mqc.bin_deviations(key = full_key)
+                    for threshold in thresholds:
+                        check_args["flagged_positions"] = [str(index) for index in deviations.outlier_bins(sample, threshold)]
+                        # check if any outliers actually found for this sample
+                        if len(check_args["flagged_positions"]) != 0:
+                            check_args["debug_message"] = FlagMessage("Outliers detected by {bin_units}", bin_units = bin_units)
+                            check_args["severity"] = check_cutoffs["outlier_thresholds"][threshold]
+                            check_args["position_units"] = bin_units
+                            flagger.flag(**check_args)
+                            flagged = True
+                            # if one threshold is flagged
+                            # the rest will flagged (because descending order)
+                            # so we break out of checks
+                            break
+                    # log passes
+                    if not flagged:
+                        check_args["debug_message"] = FlagMessage("All {bin_units} bins pass max, min, and outliers checks", bin_units = bin_units)
+                        check_args["severity"] = 30
                         flagger.flag(**check_args)
-                        flagged = True
-                        # if one threshold is flagged
-                        # the rest will flagged (because descending order)
-                        # so we break out of checks
-                        break
-                # log passes
-                if not flagged:
-                    check_args["debug_message"] = f"All {bin_units} bins pass max, min, and outliers checks"
-                    check_args["severity"] = 30
-                    flagger.flag(**check_args)
 
 def value_check_direct(partial_check_args: dict,
                        check_cutoffs: dict,
@@ -342,65 +343,64 @@ def value_check_direct(partial_check_args: dict,
                        ):
     """ Performs checks and sends appropriate flag calls for a value.
     """
-    stdev, middlepoint = get_stdev_middle(all_values, middlepoint)
-    ####################################################
-    # populate template check args with cutoffs
-    template_check_args = partial_check_args.copy()
-    if check_cutoffs["max_thresholds"]:
-        template_check_args["max_thresholds"] = check_cutoffs["max_thresholds"]
-
-    if check_cutoffs["min_thresholds"]:
-        template_check_args["min_thresholds"] = check_cutoffs["min_thresholds"]
-
-    if check_cutoffs["outlier_thresholds"]:
-        template_check_args["outlier_thresholds"] = check_cutoffs["outlier_thresholds"]
-    # TEMPLATE READY
-    ####################################################
-    flagged = False
-    # global maximum threshold checks
-    if check_cutoffs["max_thresholds"]:
-        check_args = template_check_args.copy()
-        for threshold in sorted(check_cutoffs["max_thresholds"], reverse=True):
-            if value > threshold:
-                check_args["debug_message"] = f"{value_alias} exceeds max threshold"
-                check_args["severity"] = check_cutoffs["max_thresholds"][threshold]
-                flagger.flag(**check_args)
-                flagged = True
-                break # end all checks for this value
-
-    # global minimum threshold checks
-    if check_cutoffs["min_thresholds"]:
-        check_args = template_check_args.copy()
-        ascending_thresholds = sorted(check_cutoffs["min_thresholds"])
-        for threshold in ascending_thresholds:
-            if value < threshold:
-                check_args["debug_message"] = f"{value_alias} is under min threshold"
-                check_args["severity"] = check_cutoffs["min_thresholds"][threshold]
-                flagger.flag(**check_args)
-                flagged = True
-                break # end all checks for this value
-
-    # global minimum thres
-    # outlier by standard deviation threshold checks
-    if check_cutoffs["outlier_thresholds"]:
-        check_args = template_check_args.copy()
-        if stdev == 0:
-            deviation = 0
-        else:
-            deviation = abs(value - middlepoint)/stdev
-        for threshold in sorted(check_cutoffs["outlier_thresholds"], reverse=True):
-            if deviation > threshold:
-                check_args["debug_message"] = f"{value_alias} outlier"
-                check_args["severity"] = check_cutoffs["outlier_thresholds"][threshold]
-                flagger.flag(**check_args)
-                flagged = True
-                break # end all checks for this value
-
-    if not flagged:
-        check_args = template_check_args.copy()
-        check_args["debug_message"] = f"{value_alias} passes max, min, and outliers checks"
-        check_args["severity"] = 30
-        flagger.flag(**check_args)
+    with flagger.measure(partial_check_args["check_id"]):
+        stdev, middlepoint = get_stdev_middle(all_values, middlepoint)
+        ####################################################
+        # populate template check args with cutoffs
+        template_check_args = partial_check_args.copy()
+        if check_cutoffs["max_thresholds"]:
+            template_check_args["max_thresholds"] = check_cutoffs["max_thresholds"]
+
+        if check_cutoffs["min_thresholds"]:
+            template_check_args["min_thresholds"] = check_cutoffs["min_thresholds"]
+
+        if check_cutoffs["outlier_thresholds"]:
+            template_check_args["outlier_thresholds"] = check_cutoffs["outlier_thresholds"]
+        # TEMPLATE READY
+        ####################################################
+        # every flag call below sets both debug_message and severity so the template is reused
+        check_args = template_check_args
+        flagged = False
+        # global maximum threshold checks
+        if check_cutoffs["max_thresholds"]:
+            for threshold in sorted(check_cutoffs["max_thresholds"], reverse=True):
+                if value > threshold:
+                    check_args["debug_message"] = FlagMessage("{value_alias} exceeds max threshold", value_alias = value_alias)
+                    check_args["severity"] = check_cutoffs["max_thresholds"][threshold]
+                    flagger.flag(**check_args)
+                    flagged = True
+                    break # end all checks for this value
+
+        # global minimum threshold checks
+        if check_cutoffs["min_thresholds"]:
+            ascending_thresholds = sorted(check_cutoffs["min_thresholds"])
+            for threshold in ascending_thresholds:
+                if value < threshold:
+                    check_args["debug_message"] = FlagMessage("{value_alias} is under min threshold", value_alias = value_alias)
+                    check_args["severity"] = check_cutoffs["min_thresholds"][threshold]
+                    flagger.flag(**check_args)
+                    flagged = True
+                    break # end all checks for this value
+
+        # global minimum thres
+        # outlier by standard deviation threshold checks
+        if check_cutoffs["outlier_thresholds"]:
+            if stdev == 0:
+                deviation = 0
+            else:
+                deviation = abs(value - middlepoint)/stdev
+            for threshold in sorted(check_cutoffs["outlier_thresholds"], reverse=True):
+                if deviation > threshold:
+                    check_args["debug_message"] = FlagMessage("{value_alias} outlier", value_alias = value_alias)
+                    check_args["severity"] = check_cutoffs["outlier_thresholds"][threshold]
+                    flagger.flag(**check_args)
+                    flagged = True
+                    break # end all checks for this value
+
+        if not flagged:
+            check_args["debug_message"] = FlagMessage("{value_alias} passes max, min, and outliers checks", value_alias = value_alias)
+            check_args["severity"] = 30
+            flagger.flag(**check_args)
 
 def bytes_to_gb(bytes: int) -> float:
     """ utility function, converts bytes to gb
@@ -20,7 +20,8 @@ setup(
             'scripts/V-V_Program',
            ],
    python_requires='>=3.8',
-   install_requires=['pandas','isatools'],
+   install_requires=['pandas','numpy','isatools'],
+   extras_require={'columnar': ['pyarrow'], 'zstd': ['zstandard']},
    setup_requires=['pytest-runner'],
    tests_require=['pytest']
 )
@@ -0,0 +1,649 @@
+import os
+import gc
+import gzip
+import zlib
+from pathlib import Path
+
+import pytest
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+
+from VV import flagging
+from VV.flagging import Flagger, VVError, FULL_LOG_HEADER, run_forked
+from VV.flag_messages import FlagMessage
+
+def _flag_args(**overrides):
+    args = dict(entity = "sample1",
+                debug_message = "file_size passes max, min, and outliers checks",
+                severity = 30,
+                check_id = "R_0003",
+                full_path = "/data/sample1_R1.fastq.gz",
+                filename = "sample1_R1.fastq.gz",
+                sub_entity = "forward")
+    args.update(overrides)
+    return args
+
+@pytest.fixture
+def flagger(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    yield Flagger(script = "test",
+                  log_to = tmp_path / "VV_Log" / "VV_log.tsv",
+                  halt_level = 90,
+                  flush_every = 5,
+                  force_new_flagger = True)
+
+def _data_lines(log_file: Path):
+    return [line for line in log_file.read_text().splitlines() if not line.startswith("#")]
+
+def test_flags_written_in_batches(flagger):
+    for _ in range(4):
+        flagger.flag(**_flag_args())
+    # below batch size, nothing written yet
+    assert _data_lines(flagger._log_file) == []
+    assert len(flagger.df) == 4
+
+    flagger.flag(**_flag_args())
+    lines = _data_lines(flagger._log_file)
+    assert lines[0].split("\t") == FULL_LOG_HEADER
+    assert len(lines) == 6
+    assert flagger._flag_count == 5
+
+def test_halt_flushes_pending_flags(flagger):
+    flagger.flag(**_flag_args())
+    with pytest.raises(VVError):
+        flagger.flag(**_flag_args(severity = 90, debug_message = "sample1_R1.fastq.gz not found"))
+    lines = _data_lines(flagger._log_file)
+    # header and both flags
+    assert len(lines) == 3
+    assert lines[-1].split("\t")[FULL_LOG_HEADER.index("flag_id")] == "90"
+
+def test_background_writes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    flagger = Flagger(script = "test",
+                      log_to = tmp_path / "VV_log.tsv",
+                      halt_level = 90,
+                      flush_every = 2,
+                      background_writes = True,
+                      force_new_flagger = True)
+    for _ in range(5):
+        flagger.flag(**_flag_args())
+    # flushed batches are written by the writer thread, sync waits for them
+    flagger.sync()
+    assert len(_data_lines(flagger._log_file)) == 1 + 5
+    writer_thread = flagger._writer._thread
+    # halting drains the writer and closes the log file
+    with pytest.raises(VVError):
+        flagger.flag(**_flag_args(severity = 90))
+    assert not writer_thread.is_alive()
+    assert len(_data_lines(flagger._log_file)) == 1 + 6
+
+def test_existing_log_appended_without_new_header(flagger, tmp_path):
+    flagger.flag(**_flag_args())
+    flagger.flush()
+    second = Flagger(script = "test",
+                     log_to = tmp_path / "VV_Log" / "VV_log.tsv",
+                     halt_level = 90,
+                     force_new_flagger = True)
+    second.flag(**_flag_args(entity = "sample2"))
+    second.flush()
+    lines = _data_lines(second._log_file)
+    assert len(lines) == 3
+    assert lines[-1].startswith("sample2\tR1\t")
+
+def test_append_does_not_load_existing_log(flagger, tmp_path, monkeypatch):
+    for _ in range(3):
+        flagger.flag(**_flag_args(check_id = "R_1011"))
+    flagger.close()
+    monkeypatch.setattr(pd, "read_csv", lambda *args, **kwargs: pytest.fail("log file was parsed"))
+    second = Flagger(script = "test",
+                     log_to = tmp_path / "VV_Log" / "VV_log.tsv",
+                     halt_level = 90,
+                     force_new_flagger = True)
+    second.flag(**_flag_args(check_id = "R_1011", entity = "sample2"))
+    assert second.count_flags("R_1011") == 1
+    assert len(second.df) == 1
+    monkeypatch.undo()
+
+    assert second._get_log_as_df(this_run_only = True)["sample"].tolist() == ["sample2"]
+    # header line and flags from both runs
+    assert len(second._get_log_as_df()) == 1 + 4
+
+def test_messages_rendered_when_written(flagger):
+    flagger.flag(**_flag_args(debug_message = "percent_gc outlier [value: 52.0000001][stdevs: 3.14159]"))
+    flagger.flag(**_flag_args(debug_message = FlagMessage("{value_alias} outlier [value: {value}]",
+                                                          value_alias = "percent_gc",
+                                                          value = 52.0000001)))
+    message = flagger._store._buffers["debug_message"][0]
+    assert message._text is None
+    flagger.flush()
+    debug_messages = [line.split("\t")[FULL_LOG_HEADER.index("debug_message")]
+                      for line in _data_lines(flagger._log_file)[1:]]
+    assert debug_messages == ["percent_gc outlier [value: 52.0] [stdevs: 3.1]",
+                              "percent_gc outlier [value: 52.0]"]
+
+def test_flag_many_halts_in_order(flagger):
+    results = pd.DataFrame({"entity": ["sample1", "sample2", "sample3"],
+                            "severity": [30, 90, 50],
+                            "debug_message": ["passes", "missing", "warning"]})
+    with pytest.raises(VVError):
+        flagger.flag_many(check_id = "M_0003", results = results, full_path = "/data/s.genes.results", filename = "s.genes.results")
+    # rows after the halting row are not flagged
+    assert flagger.df["sample"].tolist() == ["sample1", "sample2"]
+    assert flagger.df["flag_id"].tolist() == [30, 90]
+    assert flagger.count_flags("M_0003") == 2
+
+    with pytest.raises(ValueError):
+        flagger.flag_many(check_id = "M_0004", results = {"entity": ["sample1"], "severity": [30, 30]}, debug_message = "", full_path = "", filename = "")
+    # argument errors are raised before any row is flagged
+    with pytest.raises(ValueError, match = "Missing flag arguments for M_0004.*'full_path'"):
+        flagger.flag_many(check_id = "M_0004", results = results, filename = "s.isoforms.results")
+    with pytest.raises(ValueError, match = "Unknown flag arguments for M_0004: \\['sample'\\]"):
+        flagger.flag_many(check_id = "M_0004", results = results, sample = "sample1", full_path = "", filename = "")
+    with pytest.raises(ValueError, match = "both result columns and common arguments: \\['severity'\\]"):
+        flagger.flag_many(check_id = "M_0004", results = results, severity = 30, full_path = "", filename = "")
+    assert flagger.count_flags("M_0004") == 0
+
+def test_persist_min_severity(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    flagger = Flagger(script = "test",
+                      log_to = tmp_path / "VV_log.tsv",
+                      halt_level = 90,
+                      persist_min_severity = 50,
+                      force_new_flagger = True)
+    for sample, severity in [("sample1", 30), ("sample1", 30), ("sample2", 30), ("sample2", 50), ("sample3", 20)]:
+        flagger.flag(**_flag_args(entity = sample, severity = severity, check_id = "R_1011"))
+    # counted flags are included in queries
+    assert flagger.count_flags("R_1011") == 5
+    assert flagger.count_flags("R_1011", [30]) == 3
+    assert flagger._flag_count == 5
+    flagger.close()
+
+    lines = _data_lines(flagger._log_file)
+    assert len(lines) == 1 + 1
+    counted = (tmp_path / "counted__VV_log.tsv").read_text().splitlines()
+    assert counted == ["step\tcheck_id\tsample\tseverity\tflag_id\tcount",
+                       "General VV\tR_1011\tsample1\tPassed-Green\t30\t2",
+                       "General VV\tR_1011\tsample2\tPassed-Green\t30\t1",
+                       "General VV\tR_1011\tsample3\tInfo-Only\t20\t1"]
+
+def test_counted_flags_after_close_written_at_exit(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    flagger = Flagger(script = "test",
+                      log_to = tmp_path / "VV_log.tsv",
+                      halt_level = 90,
+                      persist_min_severity = 50,
+                      force_new_flagger = True)
+    flagger.close()
+    flagger.flag(**_flag_args())
+    assert flagger in flagging._open_flaggers
+    flagging._close_open_flaggers()
+    counted = (tmp_path / "counted__VV_log.tsv").read_text().splitlines()
+    assert counted[1:] == ["General VV\tR_0003\tsample1\tPassed-Green\t30\t1"]
+
+def test_fork_and_merge(flagger):
+    star = flagger.fork(step = "STAR")
+    rsem = flagger.fork(step = "RSEM")
+    rsem.flag(**_flag_args(entity = "sample1", check_id = "M_0003"))
+    star.flag(**_flag_args(entity = "sample1", check_id = "S_0003"))
+    star.flag(**_flag_args(entity = "sample2", check_id = "S_0003", severity = 50))
+    # forks do not write to the log
+    assert len(flagger.df) == 0
+    star.sync()
+    assert star.count_flags("S_0003") == 2
+    with pytest.raises(ValueError):
+        star._get_log_as_df()
+
+    flagger.merge([star, rsem])
+    assert flagger.df["step"].tolist() == ["STAR", "STAR", "RSEM"]
+    assert flagger._flag_count == 3
+    assert flagger._flag_dict == {30: 2, 50: 1}
+
+def test_merge_halts_on_halting_flag(flagger):
+    first, second = flagger.fork(), flagger.fork()
+    first.flag(**_flag_args())
+    with pytest.raises(VVError):
+        first.flag(**_flag_args(severity = 90))
+    second.flag(**_flag_args(entity = "sample2"))
+    with pytest.raises(VVError):
+        flagger.merge([first, second])
+    # as if flagged directly: halting flag is written, later flags are not
+    lines = _data_lines(flagger._log_file)
+    assert len(lines) == 1 + 2
+    assert lines[-1].split("\t")[FULL_LOG_HEADER.index("flag_id")] == "90"
+
+def _step_task(flagger, samples: list, severity: int = 30):
+    for sample in samples:
+        flagger.flag(**_flag_args(entity = sample, severity = severity, debug_message = "value [value: 0.123456]"))
+    return len(samples)
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_run_forked_matches_serial(tmp_path, use_processes, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tasks = [(_step_task, "Raw Reads", {"samples": ["sample1", "sample2"]}),
+             (_step_task, "STAR", {"samples": ["sample1"], "severity": 50}),
+             (_step_task, "RSEM", {"samples": ["sample2", "sample3"]})]
+    serial = Flagger(script = "test", log_to = tmp_path / "serial.tsv", halt_level = 90, independent = True)
+    for function, step, kwargs in tasks:
+        serial.set_step(step)
+        function(flagger = serial, **kwargs)
+    serial.close()
+    parallel = Flagger(script = "test", log_to = tmp_path / "parallel.tsv", halt_level = 90, independent = True)
+    if use_processes:
+        with ProcessPoolExecutor(max_workers = 2) as executor:
+            assert run_forked(parallel, tasks, executor = executor) == [2, 1, 2]
+    else:
+        assert run_forked(parallel, tasks) == [2, 1, 2]
+    parallel.close()
+
+    assert _data_lines(tmp_path / "parallel.tsv") == _data_lines(tmp_path / "serial.tsv")
+    assert parallel._flag_count == serial._flag_count == 5
+    assert parallel._flag_dict == serial._flag_dict
+
+def test_run_forked_halts_as_serial(flagger):
+    tasks = [(_step_task, "Raw Reads", {"samples": ["sample1"]}),
+             (_step_task, "STAR", {"samples": ["sample1", "sample2"], "severity": 90}),
+             (_step_task, "RSEM", {"samples": ["sample2"]})]
+    with pytest.raises(VVError):
+        run_forked(flagger, tasks)
+    assert flagger.df["step"].tolist() == ["Raw Reads", "STAR"]
+
+def test_independent_flaggers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with Flagger(script = "test", log_to = tmp_path / "GLDS-1.tsv", halt_level = 90, independent = True) as first, \
+         Flagger(script = "test", log_to = tmp_path / "GLDS-2.tsv", halt_level = 90, independent = True) as second:
+        assert first is not second
+        first.flag(**_flag_args())
+    # closed on exit
+    assert len(_data_lines(tmp_path / "GLDS-1.tsv")) == 1 + 1
+    assert _data_lines(tmp_path / "GLDS-2.tsv") == []
+
+def test_replaced_flagger_written_at_exit(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    replaced = Flagger(script = "test", log_to = tmp_path / "a.tsv", halt_level = 90, force_new_flagger = True)
+    for _ in range(3):
+        replaced.flag(**_flag_args())
+    Flagger(script = "test", log_to = tmp_path / "b.tsv", halt_level = 90, force_new_flagger = True)
+    del replaced
+    gc.collect()
+    # pending flags of the replaced flagger are written by the exit handler
+    [replaced] = [flagger for flagger in flagging._open_flaggers if flagger._log_file == tmp_path / "a.tsv"]
+    flagging._close_open_flaggers()
+    assert len(_data_lines(tmp_path / "a.tsv")) == 1 + 3
+    assert replaced not in flagging._open_flaggers
+
+def test_sample_proportions_from_index(flagger, monkeypatch):
+    for sample, severity in [("sample1", 59), ("sample2", 49), ("sample3", 30), ("sample4", 30)]:
+        flagger.flag(**_flag_args(entity = sample, severity = severity, check_id = "R_1011"))
+    # must not touch the log file
+    monkeypatch.setattr(flagger, "_get_log_as_df", lambda: pytest.fail("log file was read"))
+    assert flagger.count_flags("R_1011") == 4
+    assert flagger.count_flags("R_1011", [59, 49]) == 2
+
+    check_args = {"check_id": "R_1011", "full_path": "multiqc_data.json", "filename": "multiqc_data.json"}
+    flagger.check_sample_proportions(check_args = check_args,
+                                     check_cutoffs = {"sample_proportion_thresholds": {60: 0.3, 50: 0.1}},
+                                     protoflag_map = {60: [59], 50: [59, 49]})
+    last = flagger.df.iloc[-1]
+    assert last["sample"] == "All_Samples"
+    assert last["flag_id"] == 50
+
+def test_all_derivative_logs_single_pass(flagger, monkeypatch):
+    for sample in ["sample1", "sample10", "sample2"]:
+        flagger.set_step("Raw Reads")
+        flagger.flag(**_flag_args(entity = sample))
+        flagger.set_step("STAR")
+        flagger.flag(**_flag_args(entity = sample, severity = 50, check_id = "S_0003"))
+    reads = list()
+    read_log = flagger._get_log_as_df
+    monkeypatch.setattr(flagger, "_get_log_as_df", lambda: reads.append(1) or read_log())
+    flagger.generate_derivative_log(log_type = "all", samples = ["sample1", "sample2"])
+    assert len(reads) == 1
+
+    log_folder = flagger._log_folder
+    # 'sample1' also matches 'sample10' rows, as with the by-sample log type
+    assert len(_data_lines(log_folder / "bySample" / "sample1__VV_log.tsv")) == 1 + 4
+    assert len(_data_lines(log_folder / "bySample" / "sample2__VV_log.tsv")) == 1 + 2
+    assert len(_data_lines(log_folder / "byStep" / "STAR__VV_log.tsv")) == 1 + 3
+    assert (log_folder / "only-issues__VV_log.tsv").is_file()
+    assert (log_folder / "Summary.tsv").is_file()
+
+def test_summary_and_entity_report(flagger):
+    flagger.set_step("Raw Reads")
+    for sample, severity in [("sample1", 30), ("sample2", 50), ("sample3", 30), ("sample4", 60)]:
+        flagger.flag(**_flag_args(entity = sample, severity = severity))
+    flagger.set_step("STAR")
+    for sample, severity in [("sample1", 60), ("sample1", 60), ("sample2", 30)]:
+        flagger.flag(**_flag_args(entity = sample, severity = severity, check_id = "S_0003", sub_entity = "NA"))
+    flagger.generate_derivative_log(log_type = "all-by-entity", samples = [])
+
+    summary = (flagger._log_folder / "Summary.tsv").read_text().splitlines()
+    assert summary == ["Step\tPercent_Samples_Red_Warning\tPercent_Samples_Yellow_Warning",
+                       "any\t50.00\t25.00",
+                       "Raw Reads\t25.00\t25.00",
+                       "STAR\t25.00\t0.00"]
+    report = (flagger._log_folder / "all-by-sample.txt").read_text()
+    # first issue of each sample is not reported
+    assert report.startswith("SAMPLE: sample\nSAMPLE: sample2\nSAMPLE: sample4\nSAMPLE: sample1\n")
+    assert report.endswith("  1. file_size passes max, min, and outliers checks\n"
+                           "    Severity: Warning-Red (60)  CheckID: S_0003\n\n")
+
+@pytest.mark.parametrize("persist_min_severity", [None, 50])
+def test_summary_includes_counted_flags(tmp_path, persist_min_severity, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    flagger = Flagger(script = "test",
+                      log_to = tmp_path / "VV_log.tsv",
+                      halt_level = 90,
+                      persist_min_severity = persist_min_severity,
+                      force_new_flagger = True)
+    flagger.set_step("Raw Reads")
+    for i in range(10):
+        flagger.flag(**_flag_args(entity = f"sample{i}", severity = 60 if i == 0 else 30))
+    flagger.set_step("STAR")
+    for i in range(10):
+        flagger.flag(**_flag_args(entity = f"sample{i}", check_id = "S_0003", sub_entity = "NA"))
+    flagger.close()
+    flagger.generate_derivative_log(log_type = "all-by-entity", samples = [])
+
+    # percents are of all samples, including those only counted
+    summary = (tmp_path / "Summary.tsv").read_text().splitlines()
+    assert summary == ["Step\tPercent_Samples_Red_Warning\tPercent_Samples_Yellow_Warning",
+                       "any\t10.00\t0.00",
+                       "Raw Reads\t10.00\t0.00",
+                       "STAR\t0.00\t0.00"]
+
+def test_streaming_derivative_logs(flagger, capsys):
+    flagger.add_streaming_derivative_logs(samples = ["sample1", "sample2"])
+    # paths are printed relative to the working directory, like other outputs
+    sample_log = (flagger._log_folder / "bySample" / "sample1__VV_log.tsv").relative_to(Path.cwd())
+    assert f">>> Streaming {sample_log}\n" in capsys.readouterr().out
+    flagger.set_step("Raw Reads")
+    flagger.flag(**_flag_args(entity = "sample1"))
+    flagger.flag(**_flag_args(entity = "sample2", severity = 60, user_message = ""))
+    # usable mid-run, once flushed
+    flagger.flush()
+
+    log_folder = flagger._log_folder
+    issues = _data_lines(log_folder / "only-issues__VV_log.tsv")
+    assert issues[0].split("\t") == [column for column in FULL_LOG_HEADER if column != "full_path"]
+    assert len(issues) == 2
+    # empty values are written as NA
+    assert issues[1].split("\t")[FULL_LOG_HEADER.index("user_message")] == "NA"
+    assert len(_data_lines(log_folder / "bySample" / "sample1__VV_log.tsv")) == 2
+    assert len(_data_lines(log_folder / "byStep" / "Raw_Reads__VV_log.tsv")) == 3
+
+def test_repeated_fields_interned(flagger):
+    for sample in ["sample1", "sample2", "sample1"]:
+        flagger.flag(**_flag_args(entity = sample, full_path = Path("/data/multiqc_data.json")))
+    assert flagger._store._dictionaries["sample"] == ["sample1", "sample2"]
+    assert flagger._store._dictionaries["full_path"] == [Path("/data/multiqc_data.json")]
+    df = flagger.df
+    assert str(df["check_id"].dtype) == "category"
+    assert df["sample"].tolist() == ["sample1", "sample2", "sample1"]
+    flagger.flush()
+    assert _data_lines(flagger._log_file)[-1].startswith("sample1\tR1\tPassed-Green\t30\t")
+
+@pytest.mark.parametrize("columnar_log", ["parquet", "arrow"])
+def test_columnar_log(tmp_path, columnar_log, monkeypatch):
+    pytest.importorskip("pyarrow")
+    from VV.log_formats import read_columnar_log
+    monkeypatch.chdir(tmp_path)
+    flagger = Flagger(script = "test",
+                      log_to = tmp_path / "VV_log.tsv",
+                      halt_level = 90,
+                      flush_every = 2,
+                      columnar_log = columnar_log,
+                      force_new_flagger = True)
+    for sample in ["sample1", "sample2", "sample3"]:
+        flagger.flag(**_flag_args(entity = sample, filename = ""))
+    flagger.close()
+
+    df = read_columnar_log(flagger.sinks[0].folder)
+    assert list(df.columns) == FULL_LOG_HEADER
+    assert df["sample"].tolist() == ["sample1", "sample2", "sample3"]
+    assert str(df["check_id"].dtype) == "category"
+    # empty values are null
+    assert df["filename"].isna().all()
+    assert df["flag_id"].tolist() == [30, 30, 30]
+
+def test_sqlite_log(flagger, tmp_path):
+    # flags from a run without the database
+    flagger.flag(**_flag_args(check_id = "R_1011", severity = 59))
+    flagger.close()
+    db = tmp_path / "VV_log.sqlite"
+    second = Flagger(script = "test",
+                     log_to = flagger._log_file,
+                     halt_level = 90,
+                     sqlite_log = db,
+                     force_new_flagger = True)
+    second.flag(**_flag_args(check_id = "R_1011", entity = "sample2"))
+    second.flag(**_flag_args(check_id = "R_1012", entity = "sample2"))
+    second.flush()
+    # existing flags are imported as their own run
+    assert second._sqlite.log_run_ids() == [1, 2]
+    assert second._sqlite.count_flags("R_1011") == 2
+    assert second._sqlite.count_flags("R_1011", [59]) == 1
+    # flagger queries are scoped to this run
+    assert second.count_flags("R_1011") == 1
+    assert second.count_flags("R_1011", [59]) == 0
+
+    df = second._get_log_as_df()
+    # matches the TSV log as parsed by pandas
+    assert df.equals(pd.read_csv(second._log_file, sep = "\t", comment = "#", names = FULL_LOG_HEADER))
+    second.close()
+
+def _sqlite_run(log_file: Path, db: Path, severity: int, sqlite: bool = True):
+    flagger = Flagger(script = "test",
+                      log_to = log_file,
+                      halt_level = 90,
+                      sqlite_log = db if sqlite else None,
+                      force_new_flagger = True)
+    flagger.set_step("Raw Reads")
+    for sample in ["sample1", "sample2"]:
+        flagger.flag(**_flag_args(entity = sample, severity = severity))
+    return flagger
+
+def test_sqlite_log_overwritten_tsv(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    log_file, db = tmp_path / "VV_log.tsv", tmp_path / "VV_log.sqlite"
+    _sqlite_run(log_file, db, severity = 60).close()
+    # as with --overwrite
+    log_file.unlink()
+    second = _sqlite_run(log_file, db, severity = 30)
+    second.close()
+    # runs from the removed log are dropped
+    df = second._get_log_as_df()
+    assert df.equals(pd.read_csv(log_file, sep = "\t", comment = "#", names = FULL_LOG_HEADER))
+    assert len(second._sqlite.log_run_ids()) == 1
+    second.generate_derivative_log(log_type = "all-by-entity", samples = [])
+    assert "Raw Reads\t0.00\t0.00" in (tmp_path / "Summary.tsv").read_text().splitlines()
+
+def test_sqlite_log_mixed_appends(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    log_file, db = tmp_path / "VV_log.tsv", tmp_path / "VV_log.sqlite"
+    _sqlite_run(log_file, db, severity = 30).close()
+    _sqlite_run(log_file, db, severity = 50).close()
+    # appended without the database
+    _sqlite_run(log_file, db, severity = 60, sqlite = False).close()
+    last = _sqlite_run(log_file, db, severity = 30)
+    last.close()
+    # the log's runs are imported again from the TSV
+    df = last._get_log_as_df()
+    assert df.equals(pd.read_csv(log_file, sep = "\t", comment = "#", names = FULL_LOG_HEADER))
+    assert len(df) == 1 + 8
+    assert len(last._sqlite.log_run_ids()) == 2
+    # in sync, the next run does not import
+    following = _sqlite_run(log_file, db, severity = 30)
+    following.close()
+    assert len(following._sqlite.log_run_ids()) == 3
+    assert following._get_log_as_df().equals(pd.read_csv(log_file, sep = "\t", comment = "#", names = FULL_LOG_HEADER))
+
+@pytest.mark.parametrize("log_compression", ["gzip", "zstd"])
+def test_compressed_log(tmp_path, log_compression, monkeypatch):
+    if log_compression == "zstd":
+        pytest.importorskip("zstandard")
+    from VV.compression import open_log
+    monkeypatch.chdir(tmp_path)
+    def run(severity):
+        flagger = Flagger(script = "test",
+                          log_to = tmp_path / "VV_log.tsv",
+                          halt_level = 90,
+                          flush_every = 2,
+                          log_compression = log_compression,
+                          force_new_flagger = True)
+        flagger.add_streaming_derivative_logs(samples = ["sample1"])
+        for _ in range(3):
+            flagger.flag(**_flag_args(severity = severity))
+        return flagger
+    run(30).close()
+    flagger = run(50)
+    assert flagger._log_file.name == "VV_log.tsv" + {"gzip": ".gz", "zstd": ".zst"}[log_compression]
+    # readable mid-run, appended runs are read as one log
+    assert list(flagger._get_log_as_df()["severity"].iloc[1:]) == ["Passed-Green"] * 3 + ["Warning-Yellow"] * 3
+    assert list(flagger._get_log_as_df(this_run_only = True)["severity"]) == ["Warning-Yellow"] * 3
+    flagger.close()
+    with open_log(tmp_path / f"only-issues__{flagger._log_file.name}") as f:
+        assert len(f.read().splitlines()) == 1 + 3
+
+def test_gzip_members_read_in_bounded_chunks(tmp_path):
+    from VV.compression import open_log, _GzipMembers
+    # highly compressible members, then a member still being written
+    log = tmp_path / "VV_log.tsv.gz"
+    with gzip.open(log, "wt") as f:
+        f.write("a" * 10 * _GzipMembers.CHUNK_SIZE + "\n")
+    with gzip.open(log, "at") as f:
+        f.write("b\n")
+    compressor = zlib.compressobj(wbits = 31)
+    with open(log, "ab") as f:
+        f.write(compressor.compress(b"c\n") + compressor.flush(zlib.Z_SYNC_FLUSH))
+    with open_log(log) as f:
+        assert f.read().splitlines() == ["a" * 10 * _GzipMembers.CHUNK_SIZE, "b", "c"]
+
+def test_check_timings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    flagger = Flagger(script = "test",
+                      log_to = tmp_path / "VV_log.tsv",
+                      halt_level = 90,
+                      check_timings = True,
+                      force_new_flagger = True)
+    with flagger.measure("R_0002"):
+        (tmp_path / "reads.txt").write_text("x" * 100000)
+        (tmp_path / "reads.txt").read_text()
+        flagger.flag(**_flag_args(check_id = "R_0002"))
+    # a flag for a new check_id begins its measurement
+    flagger.flag(**_flag_args(check_id = "R_0003"))
+    flagger.flag(**_flag_args(check_id = "R_0003"))
+    fork = flagger.fork()
+    fork.flag(**_flag_args(check_id = "R_0004"))
+    flagger.merge([fork])
+    timings = flagger.check_timings
+    assert [timings[check_id].flags for check_id in ["R_0002", "R_0003", "R_0004"]] == [1, 2, 1]
+    assert timings["R_0002"].calls == 1
+    assert timings["R_0002"].wall_seconds > 0
+    if Path("/proc/self/io").is_file():
+        assert timings["R_0002"].bytes_read >= 100000
+    flagger.close()
+    table = pd.read_csv(tmp_path / "check_timings__VV_log.tsv", sep = "\t")
+    assert set(table["check_id"]) == {"R_0002", "R_0003", "R_0004"}
+    assert table["wall_seconds"].is_monotonic_decreasing
+
+def test_check_timings_measured_block_only(tmp_path, monkeypatch):
+    import time
+    monkeypatch.chdir(tmp_path)
+    flagger = Flagger(script = "test",
+                      log_to = tmp_path / "VV_log.tsv",
+                      halt_level = 90,
+                      force_new_flagger = True)
+    check_args = {"check_id": "R_0001", "entity": "sample1"}
+    flagger.flag_file_exists(check_file = tmp_path / "reads.txt",
+                             partial_check_args = check_args,
+                             optional = True)
+    # not part of any check
+    time.sleep(0.2)
+    with flagger.measure("R_0002"):
+        # a shared check function measuring the same check continues the measurement
+        flagger.flag_file_exists(check_file = tmp_path / "reads.txt",
+                                 partial_check_args = dict(check_args, check_id = "R_0002"),
+                                 optional = True)
+        time.sleep(0.05)
+    time.sleep(0.2)
+    flagger.flag(**_flag_args(check_id = "R_0003"))
+    timings = flagger.check_timings
+    assert timings["R_0001"].wall_seconds < 0.2
+    assert 0.05 <= timings["R_0002"].wall_seconds < 0.2
+    assert timings["R_0002"].calls == 1
+    flagger.close()
+
+def test_memory_profile(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    flagger = Flagger(script = "test",
+                      log_to = tmp_path / "VV_log.tsv",
+                      halt_level = 90,
+                      memory_profile = True,
+                      force_new_flagger = True)
+    flagger.set_step("Raw Reads")
+    # held until the step ends
+    buffers = [bytearray(1 << 20) for _ in range(4)]
+    flagger.flag(**_flag_args())
+    flagger.set_step("STAR")
+    flagger.flag(**_flag_args())
+    flagger.close()
+    flagger.generate_derivative_log("only-issues", samples = ["sample1"])
+    table = pd.read_csv(tmp_path / "step_memory__VV_log.tsv", sep = "\t")
+    assert list(table["step"]) == ["General VV", "Raw Reads", "STAR", "Derivative Logs: only-issues"]
+    raw_reads = table.set_index("step").loc["Raw Reads"]
+    assert raw_reads["traced_peak_bytes"] >= 4 * (1 << 20)
+    assert raw_reads["peak_rss_bytes"] > 0
+    assert "test_flagging.py" in raw_reads["top_allocation_sites"]
+
+def test_trace(tmp_path, monkeypatch):
+    import json
+    from VV.tracing import span, stop_trace
+    monkeypatch.chdir(tmp_path)
+    flagger = Flagger(script = "test",
+                      log_to = tmp_path / "VV_log.tsv",
+                      halt_level = 90,
+                      trace = True,
+                      force_new_flagger = True)
+    try:
+        flagger.set_step("Raw Reads")
+        with span("fastq scan", "io", path = "sample1_R1.fastq.gz"):
+            flagger.flag(**_flag_args())
+        run_forked(flagger, [(_step_task, "STAR", {"samples": ["sample2"]})])
+        flagger.close()
+        events = json.loads((tmp_path / "trace__VV_log.json").read_text())["traceEvents"]
+    finally:
+        stop_trace()
+    spans = {(event["cat"], event["name"]) for event in events if event["ph"] == "X"}
+    assert {("step", "General VV"), ("step", "Raw Reads"), ("check", "R_0003"),
+            ("io", "fastq scan"), ("io", "flush")} <= spans
+    # spans from the worker thread carry its thread id
+    assert len({event["tid"] for event in events if event["ph"] == "X"}) == 2
+    assert {event["pid"] for event in events} == {os.getpid()}
+
+def test_trace_per_flagger(tmp_path, monkeypatch):
+    import json
+    from VV.tracing import stop_trace
+    monkeypatch.chdir(tmp_path)
+    def traced_run(log_to, step):
+        flagger = Flagger(script = "test",
+                          log_to = log_to,
+                          halt_level = 90,
+                          trace = True,
+                          force_new_flagger = True)
+        flagger.set_step(step)
+        flagger.flag(**_flag_args())
+        flagger.close()
+        return flagger
+    try:
+        first = traced_run(tmp_path / "first" / "VV_log.tsv", "Raw Reads")
+        traced_run(tmp_path / "second" / "VV_log.tsv", "STAR")
+        # the first flagger's trace is not replaced by the second's
+        first.generate_derivative_log("only-issues", ["sample1"])
+    finally:
+        stop_trace()
+    def steps(folder):
+        events = json.loads((tmp_path / folder / "trace__VV_log.json").read_text())["traceEvents"]
+        return {event["name"] for event in events if event.get("cat") == "step"}
+    assert "Raw Reads" in steps("first") and "STAR" not in steps("first")
+    assert "STAR" in steps("second") and "Raw Reads" not in steps("second")
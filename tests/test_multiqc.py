@@ -0,0 +1,150 @@
+import os
+import json
+from pathlib import Path
+
+import pytest
+import numpy as np
+
+from VV.multiqc import MultiQC, _JsonStream
+from VV.multiqc_cache import MultiQCCache, use_multiqc_cache
+
+SAMPLES = ["Sample_A", "Sample_B", "Sample_C"]
+
+def _file_mapping():
+    return {sample: {"forward": Path(f"/data/{sample}_R1_raw.fastq.gz"),
+                     "reverse": Path(f"/data/{sample}_R2_raw.fastq.gz")}
+            for sample in SAMPLES}
+
+def _file_names():
+    return [f"{sample}_{read}_raw" for sample in SAMPLES for read in ["R1", "R2"]]
+
+def _multiqc_json(tmp_path, file_names = None):
+    file_names = file_names or _file_names()
+    data = {
+        "report_general_stats_data": [{name: {"percent_gc": 50.0 + i} for i, name in enumerate(file_names)}],
+        "report_plot_data": {
+            "fastqc_per_base_sequence_quality_plot": {
+                "plot_type": "xy_line",
+                "config": {"ylab": "Phred Score", "xlab": "Position (bp)"},
+                # the last file has an outlier at position 2
+                "datasets": [[{"name": name, "data": [[1, 30.0], [2, 30.0 + (20 if i == 5 else i % 2)]]}
+                              for i, name in enumerate(file_names)]],
+                },
+            "fastqc_overrepresented_sequences_plot": {
+                "plot_type": "bar_graph",
+                "config": {"ylab": "Percentage of Total Sequences"},
+                "samples": [file_names],
+                "datasets": [[{"name": "Top over-represented sequence", "data": [0.1 * i for i in range(len(file_names))]}]],
+                },
+            },
+        }
+    json_file = tmp_path / "multiqc_data.json"
+    json_file.write_text(json.dumps(data))
+    return json_file
+
+def test_parse(tmp_path):
+    mqc = MultiQC(_multiqc_json(tmp_path), file_mapping = _file_mapping())
+    assert mqc.data["Sample_B"]["reverse-percent_gc"].value == 53.0
+    assert mqc.data["Sample_C"]["forward-fastqc_overrepresented_sequences_plot-Top over-represented sequence"].value == pytest.approx(0.4)
+    assert mqc.data["Sample_C"]["reverse-fastqc_per_base_sequence_quality_plot"].values == {1: 30.0, 2: 50.0}
+
+def test_file_name_matching(tmp_path):
+    mqc = MultiQC(_multiqc_json(tmp_path), file_mapping = _file_mapping())
+    assert mqc._sample_filelabel_from_filename("Sample_B_R2_raw") == ("Sample_B", "reverse")
+    # matched as a substring of the mapped paths
+    assert mqc._sample_filelabel_from_filename("/data/Sample_A_R1") == ("Sample_A", "forward")
+    with pytest.raises(ValueError, match = "matched multiple filenames"):
+        mqc._sample_filelabel_from_filename("Sample_A")
+    with pytest.raises(ValueError, match = "did not match any"):
+        mqc._sample_filelabel_from_filename("Sample_D_R1_raw")
+
+def test_unmapped_file_name_raises(tmp_path):
+    with pytest.raises(ValueError, match = "did not match any"):
+        MultiQC(_multiqc_json(tmp_path, file_names = _file_names() + ["Sample_D_R1_raw"]), file_mapping = _file_mapping())
+
+def test_plot_matrix(tmp_path):
+    mqc = MultiQC(_multiqc_json(tmp_path), file_mapping = _file_mapping())
+    plot = mqc.plot_matrices["reverse-fastqc_per_base_sequence_quality_plot"]
+    assert list(plot.sample_index) == SAMPLES
+    assert plot.bins == [1, 2]
+    assert plot.matrix.tolist() == [[30.0, 31.0], [30.0, 31.0], [30.0, 50.0]]
+    # per sample values are views of the matrix rows
+    assert mqc.data["Sample_A"]["reverse-fastqc_per_base_sequence_quality_plot"].values == {1: 30.0, 2: 31.0}
+    assert mqc.compile_subset(SAMPLES, "reverse-fastqc_per_base_sequence_quality_plot") == {1: [30.0, 30.0, 30.0], 2: [31.0, 31.0, 50.0]}
+    assert mqc.compile_subset(SAMPLES, "reverse-fastqc_per_base_sequence_quality_plot", aggregator = sum) == [61.0, 61.0, 80.0]
+
+def test_outliers_with_unplotted_bins(tmp_path):
+    json_file = _multiqc_json(tmp_path)
+    data = json.loads(json_file.read_text())
+    # Sample_A has no entry for the first bin (an implicit zero)
+    data["report_plot_data"]["fastqc_per_base_sequence_quality_plot"]["datasets"][0][0]["data"] = [[2, 30.0]]
+    json_file.write_text(json.dumps(data))
+    mqc = MultiQC(json_file, file_mapping = _file_mapping())
+    outliers = mqc.detect_outliers("forward-fastqc_per_base_sequence_quality_plot", deviation = 1)
+    assert [(sample, index) for sample, index, _ in outliers] == [("Sample_A", 1)]
+
+def test_bin_deviations(tmp_path):
+    mqc = MultiQC(_multiqc_json(tmp_path), file_mapping = _file_mapping())
+    key = "reverse-fastqc_per_base_sequence_quality_plot"
+    deviations = mqc.bin_deviations(key)
+    # memoised per key and samples
+    assert mqc.bin_deviations(key) is deviations
+    assert deviations.outlier_bins("Sample_C", 0.5) == [2]
+    assert deviations.outlier_bins("Sample_A", 0.5) == []
+    assert [(sample, index) for sample, index, _ in mqc.detect_outliers(key, deviation = 0.5)] == [("Sample_C", 2)]
+
+def test_selected_plots(tmp_path, monkeypatch):
+    # small chunks so values and strings span chunk boundaries
+    monkeypatch.setattr(_JsonStream, "CHUNK_SIZE", 7)
+    json_file = _multiqc_json(tmp_path)
+    full = MultiQC(json_file, file_mapping = _file_mapping())
+    selected = MultiQC(json_file, file_mapping = _file_mapping(),
+                       plot_keys = ["fastqc_overrepresented_sequences_plot-Top over-represented sequence"])
+    assert list(selected.plot_matrices) == []
+    assert "forward-fastqc_per_base_sequence_quality_plot" not in selected.data["Sample_A"]
+    for sample in SAMPLES:
+        assert selected.data[sample] == {key: value for key, value in full.data[sample].items()
+                                         if "fastqc_per_base_sequence_quality_plot" not in key}
+
+def _plain(mqc):
+    return {sample: {key: (value.value if hasattr(value, "value") else (value.bins, value.values)) for key, value in data.items()}
+            for sample, data in mqc.data.items()}
+
+def test_multiqc_cache(tmp_path, monkeypatch):
+    json_file = _multiqc_json(tmp_path)
+    parsed = MultiQC(json_file, file_mapping = _file_mapping())
+    use_multiqc_cache(tmp_path / "cache")
+    try:
+        MultiQC(json_file, file_mapping = _file_mapping())
+        assert len(list((tmp_path / "cache").glob("*.npz"))) == 1
+        # loaded without parsing the json
+        with monkeypatch.context() as m:
+            m.setattr(MultiQC, "_extract_multiQC_data", lambda *args, **kwargs: pytest.fail("parsed cached json"))
+            cached = MultiQC(json_file, file_mapping = _file_mapping())
+        assert _plain(cached) == _plain(parsed)
+        assert cached.detect_outliers("reverse-fastqc_per_base_sequence_quality_plot", deviation = 0.5) == \
+               parsed.detect_outliers("reverse-fastqc_per_base_sequence_quality_plot", deviation = 0.5)
+        # a changed json (or plot keys) is parsed again
+        json_file.write_text(json_file.read_text().replace("50.0", "60.0"))
+        assert MultiQC(json_file, file_mapping = _file_mapping()).data["Sample_A"]["forward-percent_gc"].value == 60.0
+        MultiQC(json_file, file_mapping = _file_mapping(), plot_keys = [])
+        assert len(list((tmp_path / "cache").glob("*.npz"))) == 3
+    finally:
+        use_multiqc_cache(None)
+
+def test_multiqc_cache_eviction(tmp_path):
+    values = np.random.default_rng(0).random(1000)
+    cache = MultiQCCache(tmp_path)
+    cache.store("a", {"values": values})
+    # room for three entries
+    cache.max_bytes = 3 * (tmp_path / "a.npz").stat().st_size
+    for key in ["b", "c"]:
+        cache.store(key, {"values": values})
+    for i, key in enumerate(["a", "b", "c"]):
+        # distinct use times
+        os.utime(tmp_path / f"{key}.npz", ns = (i * 10**9, i * 10**9))
+    # loading marks an entry as recently used
+    assert cache.load("a") is not None
+    cache.store("d", {"values": values})
+    assert cache.load("b") is None
+    assert [cache.load(key) is not None for key in ["a", "c", "d"]] == [True, True, True]